@@ -1,5 +1,4 @@
-import io
-import zipfile
+import logging
 from time import sleep
 
 import pandas as pd
@@ -10,73 +9,166 @@ from streamlit_extras.buy_me_a_coffee import button
 from streamlit_extras.switch_page_button import switch_page
 
 from utils.general_utils import (
+    COMPACT_SESSION_DATA,
     add_metadata_to_df,
+    append_to_enriched_df,
+    compact_chat_df,
+    conversation_thresholds,
+    get_activity_cube,
+    memory_report,
     add_logo,
     generate_synthetic_locations,
     app_language,
     author
 )
-from utils.parsers import _df_from_str, parse_telegram_html
+from utils.cache_utils import (
+    chat_key,
+    content_key,
+    load_cached_chat,
+    load_chat_dataset,
+    store_cached_chat,
+    store_chat_dataset
+)
+from utils.ingest_utils import (
+    is_text_export,
+    message_fingerprint,
+    parse_chat_files,
+    read_chat_head,
+    read_chat_tail,
+    text_source_info
+)
+from utils.memo_utils import new_memo
+from utils.parsers import HFormatError
 
 GOOGLE_VERIFICATION_TAG = '<meta name="google-site-verification" content="{}" />'
 
 def load_data(files):
     '''Loads and processes uploaded chat data files'''
     progress_bar = st.progress(0, text="Processing...")
-    df_list = []
 
-    for index, file in enumerate(files):
-        df_list.append(process_file(file))
-        update_progress(progress_bar, index, len(files))
-
-    # combine and add metadata to the final dataframe
-    final_df = add_metadata_to_df(pd.concat(df_list, ignore_index=True)).sort_values('timestamp')
-    st.session_state['data'] = final_df
-    st.session_state['lang'] = None
+    # the same export analyzed before is served from the on-disk cache, skipping parsing and enrichment
+    dataset_id = content_key(files)
+    cached = load_cached_chat(dataset_id)
+    if cached is not None:
+        final_df, file_name = cached
+        set_session_data(final_df, file_name, dataset_id)
+        progress_bar.progress(100)
+        return
+
+    # a newer export of a chat ingested before only has its new messages parsed and enriched
+    incremental = load_incremental_data(files)
+    if incremental is not None:
+        final_df, file_name = incremental
+    else:
+        raw_df, file_name = parse_files(files, progress_bar)
+        final_df = ingest_chat(raw_df, file_name, files)
+
+    store_cached_chat(dataset_id, final_df, file_name)
+    set_session_data(final_df, file_name, dataset_id)
     progress_bar.progress(100)
 
 
-def process_file(file):
-    '''Processes individual files based on their extension'''
-    if file.name.endswith('.txt'):
-        st.session_state['file_name'] = clean_filename(file.name)
-        return _df_from_str(file.read().decode())
-
-    elif file.name.endswith('.html'):
-        return process_telegram_html(file)
-
-    elif file.name.endswith('.zip'):
-        return process_zip_file(file)
-
-
-def process_telegram_html(file):
-    '''Processes Telegram .html files'''
+def parse_files(files, progress_bar):
+    '''Parses uploaded files into a single raw dataframe, returns it with the chat name'''
+    df_list = [None] * len(files)
+    chat_names = [None] * len(files)
+
+    # files are parsed in parallel, results are kept in upload order
+    # the app remembers the header formats it detected in WhatsApp exports, so later uploads skip the detection
+    for n_done, (index, chat_name, df, error) in enumerate(parse_chat_files(files, use_cache=True)):
+        if error is not None:
+            st.error(f"Failed to process {files[index].name}: {error}")
+        df_list[index] = df
+        chat_names[index] = chat_name
+        update_progress(progress_bar, n_done, len(files))
+
+    chat_names = [name for name in chat_names if name]
+    return pd.concat(df_list, ignore_index=True), chat_names[-1] if chat_names else None
+
+
+def ingest_chat(raw_df, file_name, files):
+    '''Adds metadata to a parsed chat, enriching only the new messages if the chat was ingested before'''
+    # the chat is identified by its first and last messages
+    if raw_df.empty:
+        raise HFormatError("No chat messages found")
+    key = chat_key(file_name, message_fingerprint(raw_df.iloc[0]))
+    last_fingerprint = message_fingerprint(raw_df.iloc[-1])
+
+    stored = load_chat_dataset(key)
+    final_df = None
+    if stored is not None:
+        stored_df, manifest = stored
+        n_rows = manifest['n_rows']
+        if len(raw_df) >= n_rows and message_fingerprint(raw_df.iloc[n_rows - 1]) == manifest['last_fingerprint']:
+            thresholds = manifest['thresholds']
+            tail = raw_df.iloc[n_rows:]
+            final_df = append_to_enriched_df(stored_df, tail, thresholds) if len(tail) else stored_df
+
+    if final_df is None:
+        # combine and add metadata to the final dataframe
+        final_df = add_metadata_to_df(raw_df).sort_values('timestamp', kind='stable')
+        thresholds = conversation_thresholds(final_df)
+
+    source = None
+    if len(files) == 1 and is_text_export(files[0].name):
+        head = read_chat_head(files[0], use_cache=True)
+        source = text_source_info(files[0], head[2]) if head else None
+
+    store_chat_dataset(key, final_df, {'file_name': file_name, 'n_rows': len(raw_df),
+                                       'last_fingerprint': last_fingerprint,
+                                       'thresholds': thresholds, 'source': source})
+    return final_df
+
+
+def load_incremental_data(files):
+    '''Reads only the tail of a single WhatsApp export that extends one ingested before, returns (df, chat name)'''
+    if len(files) != 1 or not is_text_export(files[0].name):
+        return None
     try:
-        group_name, group_df = parse_telegram_html(file.read().decode())
-        st.session_state['file_name'] = group_name
-        return group_df
-    except Exception as e:
-        st.error(f"Failed to process {file.name}: {e}")
+        head = read_chat_head(files[0], use_cache=True)
+    except Exception:
         return None
+    if head is None:
+        return None
+    file_name, first_fingerprint, hformat = head
 
+    key = chat_key(file_name, first_fingerprint)
+    stored = load_chat_dataset(key)
+    if stored is None or not stored[1].get('source'):
+        return None
+    df, manifest = stored
 
-def process_zip_file(file):
-    '''Processes zipped WhatsApp files'''
-    with io.BytesIO(file.read()) as zip_file:
-        with zipfile.ZipFile(zip_file, 'r') as z:
-            txt_file = [f for f in z.namelist() if f.endswith('.txt')][0]
-            with z.open(txt_file) as txt_file:
-                st.session_state['file_name'] = clean_filename(txt_file.name)
-                return _df_from_str(txt_file.read().decode())
-
-
-def clean_filename(filename):
-    '''Cleans up filenames by removing unwanted parts'''
-    return (
-        filename.replace('.txt', '')
-        .replace('WhatsApp Chat with', '')
-        .replace('_', '')
-    )
+    tail = read_chat_tail(files[0], manifest['source'])
+    if tail is None:
+        return None
+    if len(tail):
+        df = append_to_enriched_df(df, tail, manifest['thresholds'])
+        manifest.update(n_rows=manifest['n_rows'] + len(tail), last_fingerprint=message_fingerprint(tail.iloc[-1]),
+                        source=text_source_info(files[0], hformat))
+        store_chat_dataset(key, df, manifest)
+    return df, file_name
+
+
+def set_session_data(df, file_name, dataset_id):
+    '''Makes a loaded chat the current dataset of the session'''
+    if file_name:
+        st.session_state['file_name'] = file_name
+    if COMPACT_SESSION_DATA:
+        compact_df = compact_chat_df(df)
+        report = memory_report(df, compact_df)
+        logging.info('Session chat memory: %.1f MB -> %.1f MB', *report.loc['total', ['mb_before', 'mb_after']])
+        st.session_state['memory_report'] = report
+        df = compact_df
+    else:
+        st.session_state.pop('memory_report', None)
+    st.session_state['data'] = df
+    st.session_state['dataset_id'] = dataset_id
+    # columns derived on demand by the pages (e.g. clean_text) and filtered results belong to the previous dataset
+    st.session_state['derived_columns'] = {}
+    st.session_state['filter_memo'] = new_memo()
+    # the Basic statistics page is answered from the activity cube
+    get_activity_cube()
+    st.session_state['lang'] = None
 
 
 def update_progress(progress_bar, index, total_files):
@@ -101,10 +193,10 @@ def display_home_screen(language):
 def display_upload_prompt(language):
     '''Displays the upload file prompt'''
     upload_text = {
-        "en": "Supports Telegram (.html) and WhatsApp (.txt & .zip) exported files", 
-        "ru": "Поддерживает файлы из Telegram (.html) и WhatsApp (.txt & .zip)"
+        "en": "Supports Telegram (.html & .json) and WhatsApp (.txt & .zip) exported files", 
+        "ru": "Поддерживает файлы из Telegram (.html & .json) и WhatsApp (.txt & .zip)"
     }
-    return st.file_uploader(upload_text[language], type=["txt", "html", "zip"], accept_multiple_files=True)
+    return st.file_uploader(upload_text[language], type=["txt", "html", "json", "zip"], accept_multiple_files=True)
 
 
 def display_how_to_export(language):
@@ -0,0 +1,159 @@
+'''Deterministic synthetic chat exports for the parser benchmarks'''
+import argparse
+import html
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+# WhatsApp header variants as exported by the Android and iOS apps, written with strftime
+WHATSAPP_FORMATS = {
+    'whatsapp_24h': ('%d/%m/%y, %H:%M - ', '{username}: '),
+    'whatsapp_12h': ('%m/%d/%y, %I:%M %p - ', '{username}: '),
+    'whatsapp_24h_seconds': ('%d.%m.%Y, %H:%M:%S - ', '{username}: '),
+    'whatsapp_ios': ('[%d/%m/%y, %H:%M:%S] ', '{username}: '),
+    'whatsapp_ios_12h': ('[%m/%d/%y, %I:%M:%S %p] ', '{username}: '),
+}
+TELEGRAM_FORMATS = ('telegram_html', 'telegram_json')
+FORMATS = tuple(WHATSAPP_FORMATS) + TELEGRAM_FORMATS
+
+FILE_EXTENSIONS = {'telegram_html': '.html', 'telegram_json': '.json'}
+
+USERNAMES = ['Alice', 'Bob', 'Carol Smith', 'Dave', 'Eve Johnson', 'Frank', 'Grace', 'Heidi Müller',
+             '+1 555 010 2030', '+44 7700 900123', 'Иван', 'Olivia', 'Peggy', 'Rupert', 'Sybil', 'Trent']
+WORDS = ['the', 'and', 'you', 'that', 'was', 'for', 'are', 'with', 'his', 'they', 'this', 'have', 'from', 'one',
+         'had', 'word', 'but', 'not', 'what', 'all', 'were', 'when', 'your', 'can', 'said', 'there', 'use', 'each',
+         'which', 'she', 'how', 'their', 'will', 'other', 'about', 'out', 'many', 'then', 'them', 'these', 'some',
+         'would', 'make', 'like', 'time', 'look', 'more', 'write', 'see', 'number', 'way', 'could', 'people',
+         'than', 'first', 'water', 'been', 'call', 'who', 'now', 'find', 'long', 'down', 'day', 'did', 'get',
+         'come', 'made', 'may', 'part', 'lol', 'ok', 'thanks', 'tomorrow', 'meeting', 'coffee', '😂', '👍', 'café']
+URLS = ['https://example.com', 'https://example.org/page?id=42', 'http://test.example.net/a/b']
+MEDIA = '<Media omitted>'
+START_DATE = datetime(2019, 1, 1, 8, 0, 0)
+
+
+def iter_messages(n_messages, seed=0):
+    '''Yields (username, timestamp, lines, links, is_media) for n_messages messages, the same ones for a given seed'''
+    rng = random.Random(seed)
+    users = USERNAMES[:max(2, rng.randint(4, len(USERNAMES)))]
+    weights = [1 / (rank + 1) for rank in range(len(users))]
+    timestamp = START_DATE
+    for _ in range(n_messages):
+        # bursts of quick replies separated by longer pauses, like real conversations
+        gap = rng.expovariate(1 / 20) if rng.random() < 0.85 else rng.expovariate(1 / 3600)
+        timestamp += timedelta(seconds=int(gap) + 1)
+        username = rng.choices(users, weights)[0]
+
+        if rng.random() < 0.05:
+            yield username, timestamp, [MEDIA], [], True
+            continue
+
+        links = [rng.choice(URLS)] if rng.random() < 0.03 else []
+        words = rng.choices(WORDS, k=rng.randint(1, 25)) + links
+        lines = [' '.join(words)]
+        while rng.random() < 0.08:
+            lines.append(' '.join(rng.choices(WORDS, k=rng.randint(1, 10))))
+        yield username, timestamp, lines, links, False
+
+
+def write_whatsapp(f, chat_format, n_messages, seed=0):
+    '''Writes a WhatsApp text export'''
+    date_format, sender_format = WHATSAPP_FORMATS[chat_format]
+    f.write(START_DATE.strftime(date_format) + 'Messages and calls are end-to-end encrypted.\n')
+    for username, timestamp, lines, _, _ in iter_messages(n_messages, seed):
+        f.write(timestamp.strftime(date_format) + sender_format.format(username=username) + '\n'.join(lines) + '\n')
+
+
+def write_telegram_html(f, n_messages, seed=0):
+    '''Writes a Telegram HTML export (single messages.html page)'''
+    f.write('<!DOCTYPE html>\n<html>\n <head>\n  <meta charset="utf-8"/>\n  <title>Exported Data</title>\n </head>\n'
+            ' <body>\n  <div class="page_wrap">\n   <div class="page_header">\n    <div class="content">\n'
+            '     <div class="text bold">\nBenchmark Group\n     </div>\n    </div>\n   </div>\n'
+            '   <div class="page_body chat_page">\n    <div class="history">\n'
+            '     <div class="message service" id="message-1">\n      <div class="body details">\n'
+            'Group created\n      </div>\n     </div>\n')
+    previous_username = None
+    for message_id, (username, timestamp, lines, links, is_media) in enumerate(iter_messages(n_messages, seed), 1):
+        # consecutive messages of the same sender are "joined" and have no from_name, as in real exports
+        joined = username == previous_username
+        previous_username = username
+        f.write(f'     <div class="message default clearfix{" joined" if joined else ""}" id="message{message_id}">\n'
+                '      <div class="body">\n'
+                f'       <div class="pull_right date details" title="{timestamp:%d.%m.%Y %H:%M:%S} UTC+03:00">'
+                f'{timestamp:%H:%M}</div>\n')
+        if not joined:
+            f.write(f'       <div class="from_name">\n{html.escape(username)}\n       </div>\n')
+        if is_media:
+            f.write('       <div class="media_wrap clearfix">\n        <a class="photo_wrap clearfix pull_left" '
+                    f'href="photos/photo_{message_id}.jpg"><img class="photo" src="photos/photo_{message_id}.jpg"/>'
+                    '</a>\n       </div>\n')
+        else:
+            text = '<br>'.join(html.escape(line) for line in lines)
+            for link in links:
+                text = text.replace(html.escape(link), f'<a href="{html.escape(link)}">{html.escape(link)}</a>', 1)
+            f.write(f'       <div class="text">\n{text}\n       </div>\n')
+        f.write('      </div>\n     </div>\n')
+    f.write('    </div>\n   </div>\n  </div>\n </body>\n</html>\n')
+
+
+def write_telegram_json(f, n_messages, seed=0):
+    '''Writes a Telegram JSON export (result.json)'''
+    f.write('{\n "name": "Benchmark Group",\n "type": "private_supergroup",\n "id": 1234567890,\n "messages": [\n')
+    f.write(json.dumps({'id': 0, 'type': 'service', 'date': START_DATE.isoformat(), 'actor': 'Alice',
+                        'action': 'create_group', 'text': ''}))
+    for message_id, (username, timestamp, lines, links, is_media) in enumerate(iter_messages(n_messages, seed), 1):
+        message = {'id': message_id, 'type': 'message', 'date': timestamp.isoformat(), 'from': username,
+                   'from_id': f'user{USERNAMES.index(username)}'}
+        if is_media:
+            message.update(photo=f'photos/photo_{message_id}.jpg', width=640, height=480, text='')
+        elif links:
+            text = '\n'.join(lines)
+            before, _, after = text.partition(links[0])
+            message['text'] = [before, {'type': 'link', 'text': links[0]}, after]
+        else:
+            message['text'] = '\n'.join(lines)
+        f.write(',\n  ' + json.dumps(message, ensure_ascii=False))
+    f.write('\n ]\n}\n')
+
+
+def chat_file_name(chat_format, n_messages, seed=0):
+    '''File name of a generated export'''
+    return f'{chat_format}_{n_messages}_{seed}{FILE_EXTENSIONS.get(chat_format, ".txt")}'
+
+
+def generate_chat(path, chat_format, n_messages, seed=0):
+    '''Writes a synthetic export of n_messages messages in chat_format to path'''
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        if chat_format in WHATSAPP_FORMATS:
+            write_whatsapp(f, chat_format, n_messages, seed)
+        elif chat_format == 'telegram_html':
+            write_telegram_html(f, n_messages, seed)
+        elif chat_format == 'telegram_json':
+            write_telegram_json(f, n_messages, seed)
+        else:
+            raise ValueError(f"Unsupported chat format: {chat_format}")
+
+
+def ensure_chat(data_dir, chat_format, n_messages, seed=0):
+    '''Returns the path of a generated export, generating it first if it is not in data_dir yet'''
+    path = os.path.join(data_dir, chat_file_name(chat_format, n_messages, seed))
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        generate_chat(tmp_path, chat_format, n_messages, seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('format', choices=FORMATS)
+    parser.add_argument('n_messages', type=int)
+    parser.add_argument('output')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate_chat(args.output, args.format, args.n_messages, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+'''Speedup of the vectorized add_metadata_to_df over the row-wise reference, with an equality check.
+
+The row-wise reference also computes clean_text (tokenization, lemmatization, stemming), which is now computed lazily by
+the pages; it is replaced by str so that the comparison covers the enrichment itself:
+
+    python -m benchmarks.enrichment_speedup --n-messages 1000000 --min-speedup 10
+'''
+import argparse
+import json
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.chat_generator import FORMATS, ensure_chat
+from benchmarks.reference_enrichment import add_metadata_to_df_rowwise
+from benchmarks.run_benchmarks import DEFAULT_DATA_DIR, parse_chat
+from utils import general_utils, text_utils
+
+
+def timed(function, path, repeat):
+    '''Result and fastest time of repeat runs of function, each on a freshly parsed chat: a copy of the frame would
+    share the message strings of the previous run, and with them their cached UTF-8 encoding'''
+    timings = []
+    for _ in range(repeat):
+        df = parse_chat(path)
+        start = time.perf_counter()
+        result = function(df)
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-messages', type=int, default=1000000)
+    parser.add_argument('--format', choices=FORMATS, default='whatsapp_24h')
+    parser.add_argument('--min-speedup', type=float, default=10, help='exit with an error below this speedup')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per implementation, the fastest one is kept')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--output', help='JSON results file')
+    args = parser.parse_args()
+
+    text_utils.clean_text = str
+    path = ensure_chat(args.data_dir, args.format, args.n_messages)
+
+    reference, reference_seconds = timed(add_metadata_to_df_rowwise, path, args.repeat)
+    vectorized, vectorized_seconds = timed(general_utils.add_metadata_to_df, path, args.repeat)
+    pd.testing.assert_frame_equal(vectorized, reference.drop(columns='clean_text'), check_dtype=False)
+
+    result = {'format': args.format, 'n_messages': args.n_messages, 'repeat': args.repeat, 'rowwise_seconds': reference_seconds,
+              'vectorized_seconds': vectorized_seconds, 'speedup': reference_seconds / vectorized_seconds}
+    print(json.dumps(result, indent=1))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=1)
+    if result['speedup'] < args.min_speedup:
+        sys.exit(f"speedup {result['speedup']:.1f}x is below {args.min_speedup}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''Payload of the activity over time figures, with and without the downsampling of their time series.
+
+The daily charts of a synthetic chat spanning many years are built with every point and downsampled, reporting their
+points, renderer (SVG or WebGL), JSON size and the time to build and serialize them:
+
+    python -m benchmarks.figure_payload --n-messages 1000000 --max-points 0 1000
+
+With --html-dir every figure is also written to a standalone HTML file. Opened in a browser, the file times a full
+Plotly.newPlot of the figure and shows it in the page title and below the chart.
+'''
+import argparse
+import json
+import os
+import time
+
+from benchmarks.chat_generator import FORMATS, ensure_chat
+from benchmarks.run_benchmarks import DEFAULT_DATA_DIR, add_metadata_to_df, parse_chat
+from utils import graphs_utils
+
+# re-plots the loaded figure, so that the time does not include loading plotly.js and the page
+RENDER_TIME_SCRIPT = '''
+var gd = document.getElementById('{plot_id}');
+var start = performance.now();
+Plotly.newPlot(gd, gd.data, gd.layout).then(function() {
+    var report = 'render ' + (performance.now() - start).toFixed(1) + ' ms';
+    document.title = report;
+    var pre = document.createElement('pre');
+    pre.id = 'render-time';
+    pre.textContent = report;
+    document.body.appendChild(pre);
+});
+'''
+
+FIGURES = {
+    'activity_daily': lambda df, max_points: graphs_utils.generate_activity_overtime(
+        df, None, None, 'en', 'Messages', 'date', max_points=max_points),
+    'users_activity_daily': lambda df, max_points: graphs_utils.generate_users_activity_overtime(
+        df, None, None, 'en', 'date', max_points=max_points),
+}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-messages', type=int, default=1000000)
+    parser.add_argument('--format', choices=FORMATS, default='whatsapp_24h')
+    parser.add_argument('--max-points', type=int, nargs='+', default=[0, graphs_utils.SERIES_MAX_POINTS],
+                        help='points per trace, 0 keeps every point')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--html-dir', help='directory to write the figures to, as HTML pages timing their rendering')
+    parser.add_argument('--output', help='JSON results file')
+    args = parser.parse_args()
+
+    df = add_metadata_to_df(parse_chat(ensure_chat(args.data_dir, args.format, args.n_messages)))
+    results = []
+    for name, build in FIGURES.items():
+        for max_points in args.max_points:
+            fig, build_seconds = timed(build, df, max_points)
+            payload, json_seconds = timed(fig.to_json)
+            results.append({'figure': name, 'max_points': max_points,
+                            'points': sum(len(trace.x) for trace in fig.data),
+                            'renderer': 'webgl' if any(trace.type == 'scattergl' for trace in fig.data) else 'svg',
+                            'json_bytes': len(payload), 'build_seconds': build_seconds, 'json_seconds': json_seconds})
+            if args.html_dir:
+                os.makedirs(args.html_dir, exist_ok=True)
+                fig.write_html(os.path.join(args.html_dir, f'{name}_{max_points}.html'), include_plotlyjs=True,
+                               post_script=RENDER_TIME_SCRIPT)
+
+    report = {'format': args.format, 'n_messages': args.n_messages,
+              'days': int(df['epoch_day'].max() - df['epoch_day'].min() + 1), 'results': results}
+    print(json.dumps(report, indent=1))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+'''Speedup of the multi-process text normalization over the in-process one, for a range of worker counts.
+
+The messages of a synthetic chat are cleaned like clean_text does, once per worker count, each in a fresh pool:
+
+    python -m benchmarks.normalize_speedup --n-messages 1000000 --workers 1 2 4 8
+'''
+import argparse
+import json
+import time
+
+from benchmarks.chat_generator import FORMATS, ensure_chat
+from benchmarks.run_benchmarks import DEFAULT_DATA_DIR, parse_chat
+from utils import normalize_utils
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-messages', type=int, default=1000000)
+    parser.add_argument('--format', choices=FORMATS, default='whatsapp_24h')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--lang', default='english')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--output', help='JSON results file')
+    args = parser.parse_args()
+
+    messages = parse_chat(ensure_chat(args.data_dir, args.format, args.n_messages))['message'].astype(str).tolist()
+    # loads the lemmatizer data outside of the timings
+    normalize_utils.normalize_texts(['running'], args.lang)
+
+    serial, serial_seconds = timed(normalize_utils.normalize_texts, messages, args.lang)
+    results = []
+    for workers in args.workers:
+        # every worker count starts from cold token caches, like a fresh pool does
+        normalize_utils.normalize_token.cache_clear()
+        parallel, seconds = timed(normalize_utils.normalize_texts_parallel, messages, args.lang, max_workers=workers)
+        assert parallel == serial
+        results.append({'workers': workers, 'seconds': seconds, 'speedup': serial_seconds / seconds})
+
+    report = {'format': args.format, 'n_messages': args.n_messages, 'cores': normalize_utils.NORMALIZE_MAX_WORKERS,
+              'serial_seconds': serial_seconds, 'results': results}
+    print(json.dumps(report, indent=1))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
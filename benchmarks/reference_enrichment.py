@@ -0,0 +1,26 @@
+'''Row-wise add_metadata_to_df as it was before the vectorized engine, kept as the speedup and equality reference'''
+import pandas as pd
+
+from utils import general_utils, text_utils
+
+
+def add_metadata_to_df_rowwise(df, thresholds=None, previous=None):
+    df['timestamp'] = pd.to_datetime(df['date'])
+    df['year'] = df['timestamp'].dt.year
+    df['date'] = df['timestamp'].dt.date
+    df['week'] = df['timestamp'].dt.to_period('W').dt.start_time
+    df['month'] = df['timestamp'].to_numpy().astype('datetime64[M]')
+    df['hour'] = df['timestamp'].dt.hour
+    df['weekday'] = df['timestamp'].dt.dayofweek
+    wall_dates = df['timestamp'].dt.tz_localize(None) if df['timestamp'].dt.tz is not None else df['timestamp']
+    df['epoch_day'] = (wall_dates.dt.normalize() - pd.Timestamp('1970-01-01')).dt.days
+    df['epoch_week'] = (df['week'] - pd.Timestamp('1969-12-29')).dt.days // 7
+    df['epoch_month'] = (df['timestamp'].dt.year - 1970) * 12 + df['timestamp'].dt.month - 1
+    df['is_media'] = df['message'].str.contains('<Media omitted>')
+    df['text_length'] = df['message'].apply(lambda x: len(str(x).split()))
+    df['user_is_phone_number'] = df['username'].apply(lambda x: general_utils.is_phone_numbers(x))
+    df['message_has_phone_number'] = df['message'].apply(lambda x: general_utils.is_phone_numbers(x))
+    df['has_url'] = df['message'].apply(lambda x: general_utils.is_url(x))
+    df['clean_text'] = df['message'].apply(lambda x: text_utils.clean_text(x))
+    df = general_utils.add_conversation_id(df, thresholds=thresholds, previous=previous)
+    return df
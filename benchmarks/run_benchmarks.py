@@ -0,0 +1,181 @@
+'''Parser and enrichment throughput benchmarks on synthetic chats, written as JSON.
+
+Every (stage, format, size) is measured in a fresh subprocess so that its peak RSS is its own:
+
+    python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000 --output benchmarks/results.json
+'''
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.chat_generator import FORMATS, WHATSAPP_FORMATS, ensure_chat
+from utils import parsers
+from utils.ingest_utils import parse_chat_file
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_DIR = os.path.join(REPO_DIR, 'benchmarks', 'data')
+DEFAULT_SIZES = (10000, 100000, 1000000)
+WORKER_TIMEOUT = 4 * 3600
+
+
+def read_text(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def df_from_str(text):
+    return parsers._df_from_str(text)
+
+
+def df_from_stream(path):
+    return parsers._df_from_stream(path)
+
+
+def parse_telegram_html(text):
+    return parsers.parse_telegram_html(text)[1]
+
+
+def parse_telegram_html_stream(path):
+    with open(path, 'rb') as f:
+        return parsers.parse_telegram_html_stream(f)[1]
+
+
+def parse_telegram_json_stream(path):
+    with open(path, 'rb') as f:
+        return parsers.parse_telegram_json_stream(f)[1]
+
+
+def parse_chat(path):
+    '''Parses a generated export the way uploads are parsed, the setup of the enrichment stage'''
+    with open(path, 'rb') as f:
+        return parse_chat_file(os.path.basename(path), io.BytesIO(f.read()))[1]
+
+
+def add_metadata_to_df(df):
+    # imported here rather than at the top: it pulls in streamlit and nltk, which only this stage needs
+    from utils.general_utils import add_metadata_to_df
+    return add_metadata_to_df(df.copy())
+
+
+def identity(path):
+    return path
+
+
+# stage name -> (formats it applies to, untimed setup(path), timed function(setup result) returning a dataframe)
+STAGES = {
+    '_df_from_str': (tuple(WHATSAPP_FORMATS), read_text, df_from_str),
+    '_df_from_stream': (tuple(WHATSAPP_FORMATS), identity, df_from_stream),
+    'parse_telegram_html': (('telegram_html',), read_text, parse_telegram_html),
+    'parse_telegram_html_stream': (('telegram_html',), identity, parse_telegram_html_stream),
+    'parse_telegram_json_stream': (('telegram_json',), identity, parse_telegram_json_stream),
+    'add_metadata_to_df': (FORMATS, parse_chat, add_metadata_to_df),
+}
+
+
+def peak_rss_bytes():
+    '''Peak resident set size of the current process'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_worker(stage, path, repeat):
+    '''Runs one stage on one file in the current process, returns its measurements'''
+    _, setup, function = STAGES[stage]
+    argument = setup(path)
+    if stage == 'add_metadata_to_df':
+        import utils.general_utils  # noqa: F401, kept out of the timing
+    baseline_rss = peak_rss_bytes()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = function(argument)
+        timings.append(time.perf_counter() - start)
+    return {'seconds': min(timings), 'timings': timings, 'n_rows': len(df),
+            'baseline_rss_bytes': baseline_rss, 'peak_rss_bytes': peak_rss_bytes()}
+
+
+def run_stage(stage, chat_format, n_messages, path, repeat):
+    '''Measures a stage in a fresh interpreter and adds the throughput figures'''
+    command = [sys.executable, '-m', 'benchmarks.run_benchmarks', '--worker', stage, path, '--repeat', str(repeat)]
+    result = {'stage': stage, 'format': chat_format, 'n_messages': n_messages, 'bytes': os.path.getsize(path)}
+    try:
+        completed = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True, timeout=WORKER_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return {**result, 'error': f'timed out after {WORKER_TIMEOUT}s'}
+    if completed.returncode != 0:
+        return {**result, 'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                f'exit code {completed.returncode}'}
+
+    result.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+    result['messages_per_second'] = n_messages / result['seconds']
+    result['mb_per_second'] = result['bytes'] / 1e6 / result['seconds']
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='numbers of messages')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=FORMATS)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the fastest one is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='where generated chats are kept between runs')
+    parser.add_argument('--output', default='-', help='JSON results file, - for stdout')
+    parser.add_argument('--worker', nargs=2, metavar=('STAGE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(*args.worker, args.repeat)))
+        return
+
+    results = []
+    for n_messages in args.sizes:
+        for chat_format in args.formats:
+            stages = [stage for stage in args.stages if chat_format in STAGES[stage][0]]
+            if not stages:
+                continue
+            path = ensure_chat(args.data_dir, chat_format, n_messages, args.seed)
+            for stage in stages:
+                result = run_stage(stage, chat_format, n_messages, path, args.repeat)
+                results.append(result)
+                if 'error' in result:
+                    print(f"{stage:28} {chat_format:22} {n_messages:>9} error: {result['error']}", file=sys.stderr)
+                else:
+                    print(f"{stage:28} {chat_format:22} {n_messages:>9} {result['messages_per_second']:>12,.0f} msg/s "
+                          f"{result['mb_per_second']:>8.2f} MB/s {result['peak_rss_bytes'] / 2 ** 20:>8.0f} MiB",
+                          file=sys.stderr)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output == '-':
+        print(json.dumps(report, indent=1))
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+'''Checks that the chunked WhatsApp parser gives the same dataframe as the whole-text one, whatever the chunk size.
+
+A synthetic chat is written in every WhatsApp format, its messages spread evenly over --days days from the 1st of
+January, so that the first chunks only have days up to 12 and could be read month first. Every chat is parsed with
+_df_from_str and with _df_from_stream at each chunk size, with its header format and with the header format whose day
+and month are swapped (the dates then have to be flipped back), and the two dataframes are compared. A chat starting on
+the 13th, whose first chunk rules the swap out, must also have its first dataframe yielded after at most
+--max-first-reads reads:
+
+    python -m benchmarks.stream_consistency --n-messages 50000 --chunk-sizes 4096 262144
+'''
+import argparse
+import io
+import sys
+from datetime import timedelta
+
+import pandas as pd
+
+from benchmarks.chat_generator import START_DATE, WHATSAPP_FORMATS, iter_messages
+from utils import parsers
+
+# header formats of the generated chats, in the syntax of hformat
+HFORMATS = {
+    'whatsapp_24h': '%d/%m/%y, %H:%M - %name:',
+    'whatsapp_12h': '%m/%d/%y, %I:%M %p - %name:',
+    'whatsapp_24h_seconds': '%d.%m.%y, %H:%M:%S - %name:',
+    'whatsapp_ios': '[%d/%m/%y, %H:%M:%S] %name:',
+    'whatsapp_ios_12h': '[%m/%d/%y, %I:%M:%S %p] %name:',
+}
+
+
+def swap_day_month(hformat):
+    return hformat.replace('%d', '\0').replace('%m', '%d').replace('\0', '%m')
+
+
+class CountingReader(io.BytesIO):
+    '''In-memory stream counting its reads'''
+    reads = 0
+
+    def read(self, *args):
+        self.reads += 1
+        return super().read(*args)
+
+
+def dense_whatsapp_chat(chat_format, n_messages, days, start=START_DATE):
+    '''Text of a WhatsApp export of n_messages messages spread evenly over days days'''
+    date_format, sender_format = WHATSAPP_FORMATS[chat_format]
+    step = timedelta(days=days) / n_messages
+    return ''.join((start + index * step).strftime(date_format) + sender_format.format(username=username) +
+                   '\n'.join(lines) + '\n'
+                   for index, (username, _, lines, _, _) in enumerate(iter_messages(n_messages)))
+
+
+def compare(text, chunk_size, hformat):
+    '''Result of parsing a chat in chunks compared to parsing it as a whole'''
+    options = {'auto_header': False, 'hformat': hformat}
+    try:
+        expected = parsers._df_from_str(text, **options)
+    except ValueError:
+        expected = None
+    try:
+        df = parsers._df_from_stream(io.BytesIO(text.encode('utf-8')), chunk_size, **options)
+    except ValueError as e:
+        return 'ok (both fail)' if expected is None else f'fails: {e}'
+    if expected is None:
+        return 'parsed, the whole text fails'
+    try:
+        pd.testing.assert_frame_equal(df, expected)
+    except AssertionError as e:
+        return f'differs: {" ".join(str(e).split())}'
+    return 'ok'
+
+
+def first_yield_reads(text, chunk_size, hformat):
+    '''Reads of the chat before the chunked parser yields its first dataframe, and in total'''
+    reader = CountingReader(text.encode('utf-8'))
+    chunks = parsers._df_chunks_from_stream(reader, chunk_size, auto_header=False, hformat=hformat)
+    next(chunks)
+    first_reads = reader.reads
+    for _ in chunks:
+        pass
+    return first_reads, reader.reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-messages', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=20)
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[4096, 1 << 18])
+    parser.add_argument('--max-first-reads', type=int, default=2)
+    parser.add_argument('--formats', nargs='+', choices=list(WHATSAPP_FORMATS), default=list(WHATSAPP_FORMATS))
+    args = parser.parse_args()
+
+    failures = 0
+    for chat_format in args.formats:
+        text = dense_whatsapp_chat(chat_format, args.n_messages, args.days)
+        for hformat in (HFORMATS[chat_format], swap_day_month(HFORMATS[chat_format])):
+            for chunk_size in args.chunk_sizes:
+                result = compare(text, chunk_size, hformat)
+                failures += not result.startswith('ok')
+                print(f"{chat_format:22} {hformat:32} {chunk_size:>8} {result}")
+
+        text = dense_whatsapp_chat(chat_format, args.n_messages, args.days, START_DATE + timedelta(days=12))
+        for chunk_size in args.chunk_sizes:
+            first_reads, reads = first_yield_reads(text, chunk_size, HFORMATS[chat_format])
+            failures += first_reads > args.max_first_reads
+            print(f"{chat_format:22} {'from the 13th':32} {chunk_size:>8} "
+                  f"first yield after {first_reads} of {reads} reads")
+
+    if failures:
+        sys.exit(f'{failures} chunked parse(s) differ from _df_from_str or yield late')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,10 @@ import streamlit as st
 from streamlit_plotly_events import plotly_events
 from streamlit_extras.buy_me_a_coffee import button
 
-from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters, local_css
-from utils.graphs_utils import generate_piechart, generate_activity_overtime, generate_day_of_week_activity, \
-    generate_hourly_activity, generate_activity_matrix, generate_users_activity_overtime
+from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters, local_css, \
+    cube_aggregate, weekly_aggregate, count_users, count_days
+from utils.graphs_utils import count_messages, generate_piechart, generate_activity_overtime, generate_day_of_week_activity, \
+    generate_hourly_activity, generate_activity_matrix, generate_users_activity_charts
 
 
 def main():
@@ -18,7 +19,8 @@ def main():
 
     else:
 
-        filtered_df, min_date, max_date, language = add_filters()
+        # everything on this page is answered from the activity cube, not from the filtered messages
+        _, min_date, max_date, language = add_filters(frame=False)
 
         st.markdown(local_css("addons/styles/metrics.css"), unsafe_allow_html=True)
 
@@ -30,17 +32,17 @@ def main():
         col1, col2, col3 = st.columns([5, 4, 1.5], gap='large')
 
         user_metric_text = {'en': 'Overall users', 'ru': 'Всего пользователей'}
-        col1.metric(user_metric_text[language], f"{filtered_df['username'].nunique():,}")
+        col1.metric(user_metric_text[language], f"{cube_aggregate(count_users):,}")
 
         messages_metric_text = {'en': 'Overall messages', 'ru': 'Всего сообщений'}
-        col2.metric(messages_metric_text[language], f"{filtered_df.shape[0]:,}")
+        col2.metric(messages_metric_text[language], f"{cube_aggregate(count_messages):,}")
 
         days_metric_text = {'en': 'Active days', 'ru': 'Активных дней'}
-        col3.metric(days_metric_text[language], f"{filtered_df['date'].nunique():,}")
+        col3.metric(days_metric_text[language], f"{cube_aggregate(count_days):,}")
 
         col4, col5 = st.columns((6, 10))
 
-        col4.plotly_chart(generate_piechart(filtered_df, language), use_container_width=True)
+        col4.plotly_chart(cube_aggregate(generate_piechart, language), use_container_width=True)
         with col5:
             unit_lang_dict = {'en': ("Messages", "Users"), 'ru': ("Сообщения", "Пользователи")}
             unit_dict = {"Messages": "Messages", "Users": "Users", "Пользователи": "Users", "Сообщения": 'Messages'}
@@ -51,23 +53,29 @@ def main():
             gran_lang_dict = {'en': ["Monthly", "Weekly", "Daily"], 'ru': ["Ежемесячноי", "Еженедельно", "Ежедневно"]}
             tab_0, tab_1, tab_2 = st.tabs(gran_lang_dict[language])
 
-            tab_0.plotly_chart(generate_activity_overtime(filtered_df, min_date, max_date, language, unit, "month"), use_container_width=True)
-            tab_1.plotly_chart(generate_activity_overtime(filtered_df, min_date, max_date, language, unit, 'week'), use_container_width=True)
-            tab_2.plotly_chart(generate_activity_overtime(filtered_df, min_date, max_date, language, unit, 'date'), use_container_width=True)
+            tab_0.plotly_chart(cube_aggregate(generate_activity_overtime, min_date, max_date, language, unit, "month"), use_container_width=True)
+            tab_1.plotly_chart(cube_aggregate(generate_activity_overtime, min_date, max_date, language, unit, 'week'), use_container_width=True)
+            tab_2.plotly_chart(cube_aggregate(generate_activity_overtime, min_date, max_date, language, unit, 'date'), use_container_width=True)
 
         col_users, _ = st.columns((100, 1))
         with col_users:
             tab_4, tab_5, tab_6 = st.tabs(gran_lang_dict[language])
-            tab_4.plotly_chart(generate_users_activity_overtime(filtered_df, min_date, max_date, language, "month"), use_container_width=True)
-            tab_5.plotly_chart(generate_users_activity_overtime(filtered_df, min_date, max_date, language, "week"), use_container_width=True)
-            tab_6.plotly_chart(generate_users_activity_overtime(filtered_df, min_date, max_date, language, "date"), use_container_width=True)
+            users_activity_charts = cube_aggregate(generate_users_activity_charts, min_date, max_date, language)
+            tab_4.plotly_chart(users_activity_charts["month"], use_container_width=True)
+            tab_5.plotly_chart(users_activity_charts["week"], use_container_width=True)
+            tab_6.plotly_chart(users_activity_charts["date"], use_container_width=True)
 
         col6, col7 = st.columns((6, 10))
 
-        col6.plotly_chart(generate_day_of_week_activity(filtered_df, language), use_container_width=True)
-        col7.plotly_chart(generate_hourly_activity(filtered_df, language), use_container_width=True)
+        col6.plotly_chart(weekly_aggregate(generate_day_of_week_activity, language), use_container_width=True)
+        col7.plotly_chart(weekly_aggregate(generate_hourly_activity, language), use_container_width=True)
 
-        st.plotly_chart(generate_activity_matrix(filtered_df, language), use_container_width=True)
+        st.plotly_chart(weekly_aggregate(generate_activity_matrix, language), use_container_width=True)
+
+        if st.session_state.get('memory_report') is not None:
+            memory_text = {'en': 'Memory usage by column (MB)', 'ru': 'Использование памяти по столбцам (МБ)'}
+            with st.expander(memory_text[language]):
+                st.dataframe(st.session_state['memory_report'], use_container_width=True)
 
 
 if __name__ == "__main__":
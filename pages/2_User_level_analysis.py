@@ -1,6 +1,7 @@
 import streamlit as st
 import numpy as np
-from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters
+from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters, get_conversations, \
+    filtered_aggregate, count_users
 from streamlit_extras.buy_me_a_coffee import button
 from PIL import Image
 import emoji
@@ -49,18 +50,22 @@ def calc_n_user_per_row(top_n_users):
 
 def get_users_metrics(df, top_n,emoji_method, min_date, max_date):
 
-    agg_df = df.groupby('username', as_index=False).agg(n_days=('date', 'nunique'),
+    agg_df = df.groupby('username', as_index=False, observed=True).agg(n_days=('date', 'nunique'),
                                 n_messages=('username', 'count'),
-                                n_conversation=('conversation_id', 'nunique'),
                                 n_words=('text_length', 'sum'),
                                 n_media=('is_media', 'sum'))
 
     totals_df = df.agg(n_days=('date', 'nunique'),
                                 n_messages=('username', 'count'),
-                                n_conversation=('conversation_id', 'nunique'),
                                 n_words=('text_length', 'sum'),
                                 n_media=('is_media', 'sum')).max(axis=1)
 
+    # conversations are counted from the conversation table, by the date they started
+    conversations, participants = get_conversations(min_date, max_date)
+    n_conversations = participants['username'].value_counts()
+    agg_df['n_conversation'] = agg_df['username'].astype(str).map(n_conversations).fillna(0).astype(int)
+    totals_df['n_conversation'] = len(conversations)
+
     top_emoji = get_top_emojis(st.session_state['data'][st.session_state['data']['date'].between(min_date, max_date)],
                                emoji_method)
 
@@ -130,9 +135,9 @@ def main():
 
             emoji_method = method_lang_dict[language][emoji_method]
 
-        top_n_users = min(filtered_df['username'].nunique(), 8)
+        top_n_users = min(filtered_aggregate(count_users), 8)
 
-        metrics_df, totals_df = get_users_metrics(filtered_df, top_n_users, emoji_method, min_date, max_date)
+        metrics_df, totals_df = filtered_aggregate(get_users_metrics, top_n_users, emoji_method, min_date, max_date)
 
         row_a_n_users, row_b_n_users = calc_n_user_per_row(top_n_users)
 
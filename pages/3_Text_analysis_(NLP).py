@@ -4,8 +4,9 @@ import re
 from streamlit_extras.buy_me_a_coffee import button
 from annotated_text import annotated_text
 
-from utils.dl_utils import get_conv_df, get_sum_text, wake_up_models, run_trans, apply_hg_model, API_URL_SENTIMENT
-from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters, local_css
+from utils.dl_utils import get_conv_df, get_conv_texts, get_sum_text, wake_up_models, run_trans, apply_hg_model, API_URL_SENTIMENT
+from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters, local_css, \
+    get_conversations, filtered_aggregate, text_filtered_aggregate, get_text_filtered_df, lazy_tabs
 
 from utils.graphs_utils import generate_activity_overtime, generate_piechart, generate_users_activity_overtime, \
     generate_sentiment_piehart, generate_sentiment_bars
@@ -22,7 +23,7 @@ COLS_LANG_DICT = {'en': {'date': 'Date', 'week': 'Week', 'month': 'Month', 'time
                   'ru': {'date': 'Дата', 'week': 'Неделя', 'month': 'Месяц', 'timestamp': 'Отметка времени',
                          'username': 'Имя пользователя', 'message': 'Сообщение'}}
 
-def get_summarizer_df(filtered_df, language):
+def get_summarizer_df(min_date, max_date, language):
     sum_text_col1, _ = st.columns((1000, 0.1))
     with sum_text_col1:
         summrizer_title_lang_dict = {'en': 'Conversations summarizer', 'ru': 'Резюмирование переписок'}
@@ -31,9 +32,9 @@ def get_summarizer_df(filtered_df, language):
 
         filter_col0, filter_col1, filter_col2, button_col = st.columns((1, 1, 1, 1))
 
-        conv_df = filtered_df.copy()
+        conversations, _ = get_conversations(min_date, max_date)
 
-        conv_agg_df = get_conv_df(conv_df)
+        conv_agg_df = get_conv_df(conversations)
 
         date_selector_lng_dict = {'en': 'Select a date', 'ru': 'Выберите дату'}
         month_selector_lng_dict = {'en': 'Select a month', 'ru': 'Выберите месяц'}
@@ -48,8 +49,8 @@ def get_summarizer_df(filtered_df, language):
             date = st.selectbox(date_selector_lng_dict[language],
                                 conv_agg_df[conv_agg_df['month'] == month]['date'].unique())
 
-        conv_df_to_sum = conv_agg_df[conv_agg_df['date'] == date][['preproc_text']] \
-            .rename({'preproc_text': 'Conversation'}).reset_index(drop=True)
+        conv_df_to_sum = conv_agg_df[conv_agg_df['date'] == date][['first_row', 'n_messages']].reset_index(drop=True)
+        conv_df_to_sum['preproc_text'] = get_conv_texts(st.session_state['data'], conv_df_to_sum)
         conv_df_to_sum['Conversations'] = f'{conf_filed_lan_dict[language]} ' + (conv_df_to_sum.index + 1).astype(
             str)
 
@@ -129,7 +130,11 @@ def get_trends_explorer_widgets(filtered_df, min_date, max_date, language):
         text_input_lang = {'en': "Filter by text", 'ru': "Фильтровать по тексту"}
         free_text = st.text_input(text_input_lang[language], key='trends_text')
         if free_text:
-            filtered_df = filtered_df[filtered_df['message'].str.lower().str.contains(free_text.lower())]
+            filtered_df = get_text_filtered_df(free_text)
+
+        def trend_chart(function, *args):
+            # without a text filter the charts are the ones of the filter state, shared with the other pages
+            return text_filtered_aggregate(free_text, function, *args) if free_text else filtered_aggregate(function, *args)
 
         col0, col1 = st.columns((5, 5))
 
@@ -140,7 +145,7 @@ def get_trends_explorer_widgets(filtered_df, min_date, max_date, language):
                                    COLS_LANG_DICT[language]['timestamp'],
                                    COLS_LANG_DICT[language]['message']]]
 
-            temp_df[COLS_LANG_DICT[language]['message']] = temp_df[COLS_LANG_DICT[language]['username']] \
+            temp_df[COLS_LANG_DICT[language]['message']] = temp_df[COLS_LANG_DICT[language]['username']].astype(str) \
                                                            + ' (' + temp_df[COLS_LANG_DICT[language]['timestamp']] \
                                                                .astype(str) + '): ' + \
                                                            temp_df[COLS_LANG_DICT[language]['message']]
@@ -152,24 +157,27 @@ def get_trends_explorer_widgets(filtered_df, min_date, max_date, language):
         with col1:
             section_lang_dict = {'en': ["Overall chat activity", "Activity by user", "Activity share"],
                               'ru': ["Overall chat activity", "Activity by user", "Activity share"]}
-
-            tab_0, tab_1, tab_2 = st.tabs(section_lang_dict[language])
-            with tab_0:
-                gran_lang_dict = {'en': ["Monthly", "Weekly", "Daily"], 'ru': ["Ежемесячно", "Еженедельно", "Ежедневно"]}
-                sub0_0, sub0_1, sub0_2 = st.tabs(gran_lang_dict[language])
-                sub0_0.plotly_chart(generate_activity_overtime(filtered_df, min_date, max_date, language, "Messages", 'month'), use_container_width=True)
-                sub0_1.plotly_chart(generate_activity_overtime(filtered_df, min_date, max_date, language, "Messages", 'week'), use_container_width=True)
-                sub0_2.plotly_chart(generate_activity_overtime(filtered_df, min_date, max_date, language, "Messages", 'date'), use_container_width=True)
-            with tab_1:
-                sub1_0, sub1_1, sub1_2 = st.tabs(gran_lang_dict[language])
-                sub1_0.plotly_chart(generate_users_activity_overtime(filtered_df, min_date, max_date, language, "month"),
-                                    use_container_width=True)
-                sub1_1.plotly_chart(generate_users_activity_overtime(filtered_df, min_date, max_date, language, "week"),
-                                    use_container_width=True)
-                sub1_2.plotly_chart(generate_users_activity_overtime(filtered_df, min_date, max_date, language, "date"),
-                                    use_container_width=True)
-
-            tab_2.plotly_chart(generate_piechart(filtered_df, language), use_container_width=True)
+            gran_lang_dict = {'en': ["Monthly", "Weekly", "Daily"], 'ru': ["Ежемесячно", "Еженедельно", "Ежедневно"]}
+            granularities = ('month', 'week', 'date')
+
+            # only the charts of the selected tabs are computed
+            (tab_0, open_0), (tab_1, open_1), (tab_2, open_2) = lazy_tabs(section_lang_dict[language], 'trends_section')
+            if open_0:
+                with tab_0:
+                    for (sub_tab, sub_open), granularity in zip(lazy_tabs(gran_lang_dict[language], 'trends_activity'),
+                                                                granularities):
+                        if sub_open:
+                            sub_tab.plotly_chart(trend_chart(generate_activity_overtime, min_date, max_date, language,
+                                                             "Messages", granularity), use_container_width=True)
+            if open_1:
+                with tab_1:
+                    for (sub_tab, sub_open), granularity in zip(lazy_tabs(gran_lang_dict[language], 'trends_users'),
+                                                                granularities):
+                        if sub_open:
+                            sub_tab.plotly_chart(trend_chart(generate_users_activity_overtime, min_date, max_date,
+                                                             language, granularity), use_container_width=True)
+            if open_2:
+                tab_2.plotly_chart(trend_chart(generate_piechart, language), use_container_width=True)
 
     return filtered_df
 
@@ -181,7 +189,7 @@ def calc_sentimnets(filtered_df,term, chat_lang, max_words, max_messages, sample
                           (filtered_df['message'].str.lower().str.contains(pattern)) &
                           (filtered_df['text_length'] <= max_words)]
     if len(pred_df) >= max_messages:
-        pred_df = pred_df.groupby(['username', 'month'], group_keys=False) \
+        pred_df = pred_df.groupby(['username', 'month'], group_keys=False, observed=True) \
             .apply(lambda x: x.sample(frac=sample_size, replace=True))
     if not pred_df.empty:
 
@@ -272,17 +280,22 @@ def main():
         global_title_lang_dict = {'en': 'Text analysis (NLP)', 'ru': "Анализ текста (NLP)"}
         st.subheader(global_title_lang_dict[language])
 
-        trend_tab, sentiment_tab, sum_tab = st.tabs(['**Trends analysis**', '**Sentiment analysis**',
-                                                     '**Conversations summarizer (beta)**'])
+        # the body of a section only runs while its tab is selected
+        (trend_tab, trend_open), (sentiment_tab, sentiment_open), (sum_tab, sum_open) = \
+            lazy_tabs(['**Trends analysis**', '**Sentiment analysis**', '**Conversations summarizer (beta)**'],
+                      'text_analysis_section')
 
-        with trend_tab:
-            get_trends_explorer_widgets(filtered_df, min_date, max_date, language)
+        if trend_open:
+            with trend_tab:
+                get_trends_explorer_widgets(filtered_df, min_date, max_date, language)
 
-        with sentiment_tab:
-            get_sentiment_widget(filtered_df,language)
+        if sentiment_open:
+            with sentiment_tab:
+                get_sentiment_widget(filtered_df,language)
 
-        with sum_tab:
-            get_summarizer_df(filtered_df, language)
+        if sum_open:
+            with sum_tab:
+                get_summarizer_df(min_date, max_date, language)
 
 
 if __name__ == "__main__":
@@ -13,7 +13,7 @@ from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import logging
 
 from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters, \
-    get_locations_markers, local_css
+    get_locations_markers, local_css, filtered_aggregate
 from utils.graphs_utils import generate_geo_barchart, generate_geo_piehart
 from streamlit_extras.buy_me_a_coffee import button
 
@@ -75,7 +75,7 @@ def main():
     else:
         filtered_df, min_date, max_date, language = add_filters()
 
-        locations_df = get_locations_markers(filtered_df)
+        locations_df = filtered_aggregate(get_locations_markers)
 
         if st.session_state.get('file_name'):
             st.header(st.session_state.get('file_name'))
@@ -1,8 +1,10 @@
 import streamlit as st
 from streamlit_extras.buy_me_a_coffee import button
 
-from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters, local_css
-from utils.graphs_utils import generate_message_responses_flow, user_message_responses_heatmap
+from utils.general_utils import author, refer_to_load_data_section, add_logo, add_filters, local_css, \
+    filtered_aggregate, interactions_aggregate, latency_aggregate, count_users
+from utils.graphs_utils import generate_message_responses_flow, user_message_responses_heatmap, \
+    generate_reply_latency_bars, reply_latency_heatmap
 
 
 
@@ -24,8 +26,31 @@ def main():
 
         st.markdown(local_css("addons/styles/metrics.css"), unsafe_allow_html=True)
 
-        st.plotly_chart(generate_message_responses_flow(filtered_df, language, 5), use_container_width=True)
-        st.plotly_chart(user_message_responses_heatmap(filtered_df, language, 10), use_container_width=True)
+        # the replies of all the users are counted once per filter state, any number of top users is a slice of them
+        n_users = max(filtered_aggregate(count_users), 1)
+        flow_col, heatmap_col, _ = st.columns((1, 1, 2))
+        flow_lang_dict = {'en': 'Users in the message flow', 'ru': 'Пользователей в потоке сообщений'}
+        heatmap_lang_dict = {'en': 'Users in the heatmap', 'ru': 'Пользователей на тепловой карте'}
+        flow_n_users = flow_col.number_input(flow_lang_dict[language], 1, n_users, min(5, n_users))
+        heatmap_n_users = heatmap_col.number_input(heatmap_lang_dict[language], 1, n_users, min(10, n_users))
+
+        st.plotly_chart(interactions_aggregate(generate_message_responses_flow, language, flow_n_users),
+                        use_container_width=True)
+        st.plotly_chart(interactions_aggregate(user_message_responses_heatmap, language, heatmap_n_users),
+                        use_container_width=True)
+
+        latency_text = {'en': 'Reply time', 'ru': 'Время ответа'}
+        st.subheader(latency_text[language])
+        latency_note = {'en': 'Time between a message and the reply of another user in the same conversation',
+                        'ru': 'Время между сообщением и ответом другого пользователя в той же переписке'}
+        st.caption(latency_note[language])
+        latency_col, _ = st.columns((1, 3))
+        latency_lang_dict = {'en': 'Users in the reply time charts', 'ru': 'Пользователей на графиках времени ответа'}
+        latency_n_users = latency_col.number_input(latency_lang_dict[language], 1, n_users, min(10, n_users))
+        # percentiles are merged from reply delay histograms by day and pair of users, not recomputed from messages
+        st.plotly_chart(latency_aggregate(generate_reply_latency_bars, language, latency_n_users),
+                        use_container_width=True)
+        st.plotly_chart(latency_aggregate(reply_latency_heatmap, language, latency_n_users), use_container_width=True)
 
 
 if __name__ == "__main__":
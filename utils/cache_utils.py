@@ -0,0 +1,178 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.conversation_utils import CONVERSATION_GAP
+
+CACHE_DIR = os.environ.get('CHAT_ANALYZER_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'telegram-chat-analyzer'))
+
+HFORMAT_CACHE_FILE = 'hformats.json'
+HFORMAT_CACHE_MAX_ENTRIES = 1024
+
+# Bump PIPELINE_VERSION when the cached frames change in a way not visible in the pipeline sources
+PIPELINE_VERSION = '1'
+PIPELINE_MODULES = ('parsers.py', 'ingest_utils.py', 'general_utils.py', 'text_utils.py', 'conversation_utils.py',
+                    'time_utils.py')
+
+CHAT_CACHE_DIR = 'chats'
+CHAT_CACHE_MAX_BYTES = int(os.environ.get('CHAT_ANALYZER_CACHE_MAX_BYTES', 2 << 30))
+CHAT_CACHE_METADATA_KEY = b'chat_analyzer'
+
+HASH_CHUNK_SIZE = 1 << 20
+
+DATASETS_DIR = 'datasets'
+
+
+def cache_path(*parts):
+    '''Returns a path inside the cache directory'''
+    return os.path.join(CACHE_DIR, *parts)
+
+
+def load_json_cache(name):
+    '''Loads a small json cache file, returns an empty dict if it is missing or unreadable'''
+    try:
+        with open(cache_path(name), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json_cache(name, data):
+    '''Atomically writes a small json cache file, cache write failures are logged and ignored'''
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_path(name))
+    except OSError as e:
+        logging.info('Could not write cache file %s: %s', name, e)
+
+
+def get_cached_hformat(signature):
+    '''Returns the header format detected earlier for a header signature, if any'''
+    return load_json_cache(HFORMAT_CACHE_FILE).get(signature)
+
+
+def set_cached_hformat(signature, hformat):
+    '''Remembers the header format detected for a header signature, dropping the oldest entries when full'''
+    hformats = load_json_cache(HFORMAT_CACHE_FILE)
+    hformats.pop(signature, None)
+    hformats[signature] = hformat
+    while len(hformats) > HFORMAT_CACHE_MAX_ENTRIES:
+        hformats.pop(next(iter(hformats)))
+    save_json_cache(HFORMAT_CACHE_FILE, hformats)
+
+
+@functools.lru_cache(maxsize=1)
+def pipeline_fingerprint():
+    '''Hash of the pipeline version, the parsing and enrichment sources and settings, changes whenever they are edited'''
+    digest = hashlib.sha256(f'{PIPELINE_VERSION}\0{CONVERSATION_GAP}'.encode())
+    utils_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in PIPELINE_MODULES:
+        with open(os.path.join(utils_dir, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def content_key(files):
+    '''Content address of uploaded files: hash of their names and bytes, in order, plus the pipeline fingerprint'''
+    digest = hashlib.sha256(pipeline_fingerprint().encode())
+    for file in files:
+        digest.update(file.name.encode() + b'\0')
+        file.seek(0)
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        file.seek(0)
+    return digest.hexdigest()
+
+
+def load_cached_chat(key):
+    '''Loads an enriched chat frame stored under key, returns (df, file_name) or None on a miss'''
+    cached = _read_frame(cache_path(CHAT_CACHE_DIR, f'{key}.parquet'))
+    if cached is None:
+        return None
+    df, metadata = cached
+    return df, metadata.get('file_name')
+
+
+def store_cached_chat(key, df, file_name):
+    '''Stores an enriched chat frame under key as parquet, then evicts least recently used chats over budget'''
+    if _write_frame(cache_path(CHAT_CACHE_DIR), f'{key}.parquet', df, {'file_name': file_name}):
+        evict_cached_chats()
+
+
+def chat_key(file_name, first_fingerprint):
+    '''Identity of a chat across exports: its name and the fingerprint of its first message'''
+    return hashlib.sha256(f'{file_name}\0{first_fingerprint}'.encode()).hexdigest()
+
+
+def load_chat_dataset(key):
+    '''Loads the stored dataset of a chat ingested before, returns (df, manifest) or None'''
+    stored = _read_frame(cache_path(DATASETS_DIR, f'{key}.parquet'))
+    # a dataset enriched by another version of the pipeline cannot be extended with rows enriched by this one
+    if stored is None or stored[1].get('pipeline') != pipeline_fingerprint():
+        return None
+    return stored
+
+
+def store_chat_dataset(key, df, manifest):
+    '''Stores the enriched dataset of a chat with its manifest (what was ingested and how)'''
+    manifest = {**manifest, 'pipeline': pipeline_fingerprint()}
+    if _write_frame(cache_path(DATASETS_DIR), f'{key}.parquet', df, manifest):
+        evict_cached_chats(directory=DATASETS_DIR)
+
+
+def _read_frame(path):
+    try:
+        table = pq.read_table(path)
+        os.utime(path)  # the modification time is the recency used by the eviction
+    except (OSError, pa.ArrowException) as e:
+        if os.path.exists(path):
+            logging.info('Could not read cached frame %s: %s', path, e)
+        return None
+    metadata = json.loads(table.schema.metadata.get(CHAT_CACHE_METADATA_KEY, b'{}'))
+    return table.to_pandas(), metadata
+
+
+def _write_frame(directory, name, df, metadata):
+    tmp_path = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        table = pa.Table.from_pandas(df)
+        schema_metadata = {**(table.schema.metadata or {}), CHAT_CACHE_METADATA_KEY: json.dumps(metadata).encode()}
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pq.write_table(table.replace_schema_metadata(schema_metadata), f)
+        os.replace(tmp_path, os.path.join(directory, name))
+        return True
+    except (OSError, pa.ArrowException, TypeError, ValueError) as e:
+        logging.info('Could not cache frame %s: %s', name, e)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def evict_cached_chats(max_bytes=CHAT_CACHE_MAX_BYTES, directory=CHAT_CACHE_DIR):
+    '''Deletes least recently used cached chats until the cache directory fits in max_bytes'''
+    entries = []
+    for entry in os.scandir(cache_path(directory)):
+        if entry.name.endswith('.parquet'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,150 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# When the gap before a message is long enough for it to start a new conversation, as <method>:<value>:
+#   quantile:<q>    the q quantile of all the gaps of the chat
+#   fixed:<minutes> a fixed number of minutes
+#   user:<q>        the q quantile of the gaps before the messages of each sender
+CONVERSATION_GAP = os.environ.get('CHAT_ANALYZER_CONVERSATION_GAP', 'quantile:0.9')
+GAP_METHODS = ('quantile', 'fixed', 'user')
+# senders with fewer gaps than this get the quantile of the whole chat
+USER_GAP_MIN_MESSAGES = 20
+NS_PER_MINUTE = 60 * 10 ** 9
+
+
+def parse_gap_spec(spec=CONVERSATION_GAP):
+    '''Splits a gap spec like "quantile:0.9" into its method and value'''
+    method, _, value = spec.partition(':')
+    if method not in GAP_METHODS or not value:
+        raise ValueError(f"Unsupported conversation gap: {spec}, expected one of "
+                         f"{', '.join(method + ':<value>' for method in GAP_METHODS)}")
+    return method, float(value)
+
+
+def to_nanoseconds(timestamps):
+    '''Timestamps (naive or timezone aware) as an int64 array of nanoseconds'''
+    return pd.DatetimeIndex(timestamps).as_unit('ns').asi8
+
+
+def gap_minutes(timestamps):
+    '''Minutes between every timestamp of a sorted int64 nanoseconds array and the one before it, nan for the first'''
+    gaps = np.full(len(timestamps), np.nan)
+    gaps[1:] = np.diff(timestamps) / NS_PER_MINUTE
+    return gaps
+
+
+def gap_thresholds(gaps, user_codes, usernames, spec=CONVERSATION_GAP):
+    '''Gap (in minutes) from which a message starts a new conversation: {'default': minutes, 'users': {name: minutes}}.
+
+    gaps are the gaps before every message (nan when unknown) and user_codes the index of its sender in usernames.
+    '''
+    method, value = parse_gap_spec(spec)
+    if method == 'fixed':
+        return {'default': value, 'users': {}}
+
+    known = ~np.isnan(gaps)
+    default = float(np.quantile(gaps[known], value)) if known.any() else 0.0
+    if method == 'quantile':
+        return {'default': default, 'users': {}}
+
+    # the quantile of every sender at once: gaps sorted by sender then length, interpolated inside each sender's run
+    codes = user_codes[known]
+    sorted_gaps = gaps[known][np.lexsort((gaps[known], codes))]
+    counts = np.bincount(codes, minlength=len(usernames))
+    starts = np.cumsum(counts) - counts
+    users = np.flatnonzero(counts >= max(USER_GAP_MIN_MESSAGES, 1))
+    positions = starts[users] + value * (counts[users] - 1)
+    below, above = sorted_gaps[np.floor(positions).astype(int)], sorted_gaps[np.ceil(positions).astype(int)]
+    quantiles = below + (above - below) * (positions - np.floor(positions))
+    return {'default': default, 'users': {str(usernames[user]): float(q) for user, q in zip(users, quantiles)}}
+
+
+def message_thresholds(thresholds, user_codes, usernames):
+    '''Threshold of every message, the one of its sender if it has one'''
+    per_user = np.array([thresholds['users'].get(str(username), thresholds['default']) for username in usernames])
+    return per_user[user_codes] if len(per_user) else np.full(len(user_codes), thresholds['default'])
+
+
+def sessionize(timestamps, user_codes, usernames, thresholds=None, previous=None, spec=CONVERSATION_GAP):
+    '''Splits messages into conversations in a single pass over their sorted timestamps.
+
+    Args:
+        timestamps: int64 nanoseconds of the messages, in any order.
+        user_codes: index of the sender of every message in usernames.
+        usernames: distinct senders.
+        thresholds: gap thresholds (see gap_thresholds), computed from the gaps with spec when None.
+        previous: (timestamp, conversation_id) of the last message of the chat these messages continue.
+
+    Returns:
+        tuple: conversation id of every message, minutes until the next message (nan for the last one) and the
+        thresholds used, the first two in the order of timestamps.
+    '''
+    order = np.argsort(timestamps, kind='stable')
+    sorted_timestamps = timestamps[order]
+    gaps = gap_minutes(sorted_timestamps)
+    if thresholds is None:
+        thresholds = gap_thresholds(gaps, user_codes[order], usernames, spec)
+
+    first_id = 0
+    if previous is not None and len(gaps):
+        gaps[0] = (sorted_timestamps[0] - previous[0]) / NS_PER_MINUTE
+        first_id = previous[1]
+    new_conversation = gaps >= message_thresholds(thresholds, user_codes[order], usernames)
+
+    conversation_id = np.empty(len(order), dtype=np.int64)
+    conversation_id[order] = np.cumsum(new_conversation) + first_id
+    time_diff_minutes = np.empty(len(order))
+    time_diff_minutes[order] = np.append(gaps[1:], np.nan)
+    return conversation_id, time_diff_minutes, thresholds
+
+
+def conversation_tables(df):
+    '''Conversation dimension table and participants of an enriched chat sorted by timestamp.
+
+    Conversations are contiguous runs of conversation_id, so both tables come from one pass over the rows:
+    conversations (start, end, date, first_row, n_messages, n_users, n_media, n_words) indexed by conversation_id,
+    and participants (conversation_id, username, n_messages), one row per sender of every conversation.
+    '''
+    conversation_id = df['conversation_id'].to_numpy()
+    starts = np.flatnonzero(np.diff(conversation_id, prepend=np.nan) != 0)
+    n_messages = np.diff(np.append(starts, len(df)))
+    run = np.repeat(np.arange(len(starts)), n_messages)
+
+    user_codes, usernames = pd.factorize(df['username'].astype(str))
+    pairs, pair_messages = np.unique(run * max(len(usernames), 1) + user_codes, return_counts=True)
+    pair_runs = pairs // max(len(usernames), 1)
+
+    ids = pd.Index(conversation_id[starts], name='conversation_id')
+    conversations = pd.DataFrame({
+        'start': df['timestamp'].iloc[starts].array,
+        'end': df['timestamp'].iloc[starts + n_messages - 1].array,
+        'date': df['date'].iloc[starts].array,
+        'first_row': starts,
+        'n_messages': n_messages,
+        'n_users': np.bincount(pair_runs, minlength=len(starts)),
+        'n_media': np.bincount(run, weights=df['is_media'].to_numpy(dtype=float), minlength=len(starts)).astype(int),
+        'n_words': np.bincount(run, weights=df['text_length'].to_numpy(dtype=float), minlength=len(starts)).astype(int),
+    }, index=ids)
+    participants = pd.DataFrame({'conversation_id': ids[pair_runs],
+                                 'username': usernames[pairs % max(len(usernames), 1)],
+                                 'n_messages': pair_messages})
+    return conversations, participants
+
+
+def select_conversations(conversations, participants, users=None, years=None, min_date=None, max_date=None):
+    '''Conversations started in the selected years and dates that one of the selected users took part in.
+
+    Returns the selected conversations and their participants among the selected users.
+    '''
+    selected = pd.Series(True, index=conversations.index)
+    if min_date is not None and max_date is not None:
+        selected &= conversations['date'].between(min_date, max_date)
+    if years:
+        selected &= conversations['start'].dt.year.isin(years)
+    participants = participants[participants['conversation_id'].isin(conversations.index[selected])]
+    if users:
+        participants = participants[participants['username'].isin(users)]
+        selected &= conversations.index.isin(participants['conversation_id'])
+    return conversations[selected], participants
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from utils.filter_utils import day_intervals
+from utils.time_utils import EPOCH_WEEKDAY, epoch_months, epoch_weeks
+
+
+def build_activity_cube(df):
+    '''Message and word counts of an enriched chat by (day, user, hour), sorted by day.
+
+    Every cell also carries the weekday, week and month of its day, so that the activity charts and metrics of any
+    date, year and user selection can be answered from the cube instead of the messages.
+    '''
+    user_codes, usernames = pd.factorize(df['username'].astype(str))
+    epoch_day = df['epoch_day'].to_numpy(dtype=np.int64)
+    first_day = epoch_day.min() if len(df) else 0
+    n_users = max(len(usernames), 1)
+    cells, inverse = np.unique(((epoch_day - first_day) * n_users + user_codes) * 24 + df['hour'].to_numpy(),
+                               return_inverse=True)
+
+    cube_day = cells // (24 * n_users) + first_day
+    return pd.DataFrame({
+        'epoch_day': cube_day.astype(np.int32),
+        'username': pd.Categorical.from_codes(cells // 24 % n_users, categories=usernames),
+        'hour': (cells % 24).astype(np.int8),
+        'weekday': ((cube_day + EPOCH_WEEKDAY) % 7).astype(np.int8),
+        'epoch_week': epoch_weeks(cube_day).astype(np.int32),
+        'epoch_month': epoch_months(cube_day).astype(np.int32),
+        'n_messages': np.bincount(inverse, minlength=len(cells)).astype(np.int32),
+        'n_words': np.bincount(inverse, weights=df['text_length'].to_numpy(dtype=float),
+                               minlength=len(cells)).astype(np.int64),
+    })
+
+
+def select_cube(cube, min_date=None, max_date=None, users=None, years=None):
+    '''Cells of the activity cube in the selected dates and years, of the selected users'''
+    epoch_day = cube['epoch_day'].to_numpy()
+    intervals = day_intervals({'epoch_day': epoch_day}, min_date, max_date, years)
+    rows = np.concatenate([np.arange(start, end) for start, end in intervals] + [np.empty(0, dtype=np.int64)])
+    if users:
+        rows = rows[cube['username'].iloc[rows].isin(users).to_numpy()]
+    return cube.iloc[rows]
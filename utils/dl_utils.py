@@ -25,27 +25,21 @@ def preprc_text_for_sum(row):
     row.message = row.message.replace('<media omitted>', '<here is a photo>')
     return row.username + ': ' + row.message
 
-@st.cache_data(show_spinner=False)
-def get_conv_df(df, min_users=2, min_messages=4, min_length=8):
-
-    df['preproc_text'] = df.apply(lambda x: preprc_text_for_sum(x), axis=1)
-
-    conv_df = df.groupby('conversation_id') \
-        .agg({"preproc_text": '\n'.join,
-              'username': 'nunique',
-              'timestamp': 'count',
-              'is_media': 'sum',
-              'text_length': 'sum',
-              'date': 'min'}) \
-        .rename(columns={'username': 'n_users',
-                         'timestamp': 'n_messages'})
-    conv_df = conv_df[(conv_df['n_users'] >= min_users) &
-                      (conv_df['n_messages'] >= min_messages) &
-                      (conv_df['text_length'] >= min_length) &
-                      (conv_df['n_messages'] > conv_df['is_media'])].reset_index()
+def get_conv_df(conversations, min_users=2, min_messages=4, min_length=8):
+    '''Conversations worth summarizing, from the conversation table of the chat'''
+    conv_df = conversations[(conversations['n_users'] >= min_users) &
+                            (conversations['n_messages'] >= min_messages) &
+                            (conversations['n_words'] >= min_length) &
+                            (conversations['n_messages'] > conversations['n_media'])].reset_index()
     conv_df['month'] = pd.to_datetime(conv_df['date']).dt.to_period('M')
     return conv_df
 
+
+def get_conv_texts(df, conv_df):
+    '''Text of every conversation of conv_df, one "username: message" line per message of the chat df'''
+    return [df.iloc[first_row:first_row + n_messages].apply(preprc_text_for_sum, axis=1).str.cat(sep='\n')
+            for first_row, n_messages in zip(conv_df['first_row'], conv_df['n_messages'])]
+
 st.cache_data(show_spinner=False)
 def query_hg(payload, model_api_url):
     data = json.dumps(payload)
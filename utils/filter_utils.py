@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from utils.time_utils import date_ordinal, epoch_days
+
+NO_ROWS = np.empty(0, dtype=np.int64)
+
+
+def build_filter_index(df):
+    '''Index of the session chat for the sidebar filters, built once per dataset.
+
+    Rows are located by binary search over their epoch days (sorted, or through day_order when the chat is not),
+    years by the epoch days they span and users by the code of every row, looked up in a bitmap of the selection.
+    '''
+    epoch_day = df['epoch_day'].to_numpy(dtype=np.int64)
+    day_order = None
+    if np.any(epoch_day[1:] < epoch_day[:-1]):
+        day_order = np.argsort(epoch_day, kind='stable')
+        epoch_day = epoch_day[day_order]
+
+    user_codes, usernames = pd.factorize(df['username'].astype(str))
+
+    return {
+        'n_rows': len(df),
+        'epoch_day': epoch_day,
+        'day_order': day_order,
+        'users': list(usernames),
+        'user_codes': user_codes.astype(np.min_scalar_type(max(len(usernames) - 1, 0))),
+        'years': [int(year) for year in pd.unique(df['year'])],
+        'min_date': df['date'].min() if len(df) else None,
+        'max_date': df['date'].max() if len(df) else None,
+    }
+
+
+def day_intervals(index, min_date=None, max_date=None, years=None):
+    '''Intervals [start, end) of positions in the epoch day order of the rows in the dates and years selected'''
+    first = -np.inf if min_date is None else date_ordinal('date', min_date)
+    last = np.inf if max_date is None else date_ordinal('date', max_date)
+    spans = [(first, last)]
+    if years:
+        january_firsts = epoch_days([f'{year}-01-01' for year in sorted(years)] +
+                                    [f'{year + 1}-01-01' for year in sorted(years)])
+        spans = [(max(first, start), min(last, end - 1))
+                 for start, end in zip(january_firsts[:len(years)], january_firsts[len(years):])]
+    bounds = [(np.searchsorted(index['epoch_day'], start, 'left'), np.searchsorted(index['epoch_day'], end, 'right'))
+              for start, end in spans if start <= end]
+    return [(start, end) for start, end in bounds if start < end]
+
+
+def select_rows(index, min_date=None, max_date=None, users=None, years=None):
+    '''Rows of the chat selected by the sidebar filters: a slice when they are a contiguous range, else positions'''
+    intervals = day_intervals(index, min_date, max_date, years)
+    if index['day_order'] is not None:
+        # rows out of day order: the positions of every interval, back in row order
+        rows = np.sort(np.concatenate([index['day_order'][start:end] for start, end in intervals] + [NO_ROWS]))
+    elif not users and len(intervals) == 1:
+        return slice(*intervals[0])
+    else:
+        rows = np.concatenate([np.arange(start, end) for start, end in intervals] + [NO_ROWS])
+
+    if users:
+        selected = np.zeros(len(index['users']), dtype=bool)
+        codes = pd.Index(index['users']).get_indexer(users)
+        selected[codes[codes >= 0]] = True
+        rows = rows[selected[index['user_codes'][rows]]]
+    return rows
@@ -1,4 +1,8 @@
+import os
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import streamlit as st
 from streamlit_extras.switch_page_button import switch_page
 import pygeohash as pgh
@@ -8,11 +12,61 @@ from datetime import timedelta
 
 import nltk
 
-from utils.text_utils import clean_text, detect_lang
+from utils.conversation_utils import (
+    CONVERSATION_GAP,
+    conversation_tables,
+    gap_minutes,
+    gap_thresholds,
+    select_conversations,
+    sessionize,
+    to_nanoseconds
+)
+from utils.cube_utils import build_activity_cube, select_cube
+from utils.filter_utils import build_filter_index, select_rows
+from utils.interaction_utils import chat_interactions
+from utils.latency_utils import build_reply_latencies, select_reply_latencies
+from utils.memo_utils import memoized, new_memo
+from utils.text_utils import detect_lang
+from utils.time_utils import NS_PER_DAY, NS_PER_HOUR, epoch_months, epoch_weeks, weekly_activity
 
 GOOGLE_URL_PATTERN = r"(https:\/\/maps\.google\.com\/\?q=-?\d+\.\d+,-?\d+\.\d+)"
 GEOHASH_FOR_EXAMPLE_CHAT = ["dr72", "sr2y", "xn77", "stq4"]
 
+# Set CHAT_ANALYZER_COMPACT_DATA=0 to keep the session chat in the plain (object columns) layout
+COMPACT_SESSION_DATA = os.environ.get('CHAT_ANALYZER_COMPACT_DATA', '1') != '0'
+# the characters Python regexes treat as whitespace (\s), as the body of an Arrow (RE2) character class
+PYTHON_WHITESPACE = r'\s\v\x1c-\x1f\x85\p{Z}'
+# bytes of the messages whose words are counted by an Arrow regex rather than on their UTF-8 data: the control
+# characters str.split() does not split on, and the first bytes of the non-ASCII whitespace (e.g. no-break space)
+EXACT_WORD_COUNT_BYTES = np.zeros(256, dtype=bool)
+EXACT_WORD_COUNT_BYTES[[*range(0, 9), *range(14, 28)]] = True
+EXACT_WORD_COUNT_BYTES[[chr(code).encode()[0] for code in range(0x80, 0x3001) if chr(code).isspace()]] = True
+# first bytes of the messages that can be a phone number (see are_phone_numbers) or start with a link (see have_urls)
+PHONE_NUMBER_FIRST_BYTES = np.zeros(256, dtype=bool)
+PHONE_NUMBER_FIRST_BYTES[list(b'0123456789-+ ')] = True
+URL_FIRST_BYTES = np.zeros(256, dtype=bool)
+URL_FIRST_BYTES[list(b'h ')] = True
+# the byte scans of the messages go through their UTF-8 data in blocks of about this many bytes, which stay in cache
+TEXT_BLOCK_BYTES = 1 << 20
+COMPACT_DTYPES = {
+    'username': 'category',
+    'hour': 'int8',
+    'weekday': 'int8',
+    'epoch_day': 'int32',
+    'epoch_week': 'int32',
+    'epoch_month': 'int32',
+    'date': pd.ArrowDtype(pa.date32()),
+    'year': 'int16',
+    'text_length': 'int32',
+    'conversation_id': 'int32',
+    'time_diff_minutes': 'float32',
+    'is_media': 'bool',
+    'user_is_phone_number': 'bool',
+    'message_has_phone_number': 'bool',
+    'has_url': 'bool',
+    'message': 'string[pyarrow]',
+}
+
 
 def app_language():
     language = st.sidebar.selectbox('Language', ['English', 'Русский'])
@@ -80,12 +134,25 @@ def refer_to_load_data_section():
         switch_page("home")
 
 
-def add_conversation_id(df,threshold_quantile=0.9):
-    df = df.join(df[['timestamp']].shift(-1), lsuffix='', rsuffix='_prev')
-    df['time_diff_minutes'] = ((df['timestamp_prev'] - df['timestamp']).dt.seconds / 60)
-    df['conversation_id'] = (df['time_diff_minutes'] >= df['time_diff_minutes'].quantile(threshold_quantile)).astype(int).cumsum()
-    df.loc[(df['time_diff_minutes'] >= df['time_diff_minutes'].quantile(0.8)), 'conversation_id'] -= 1
-    return df.drop('timestamp_prev', axis=1)
+def conversation_thresholds(df, spec=CONVERSATION_GAP):
+    '''Gap thresholds that split an enriched chat into conversations, kept to extend it later'''
+    user_codes, usernames = pd.factorize(df['username'].astype(str))
+    timestamps = to_nanoseconds(df['timestamp'])
+    order = np.argsort(timestamps, kind='stable')
+    return gap_thresholds(gap_minutes(timestamps[order]), user_codes[order], usernames, spec)
+
+
+def add_conversation_id(df, thresholds=None, previous=None, spec=CONVERSATION_GAP, users=None):
+    # previous is the last row of an already enriched chat that df continues, its conversation ids go on from it;
+    # users is the factorized username column when the caller already has it
+    if previous is not None:
+        previous = to_nanoseconds(previous['timestamp'])[0], int(previous['conversation_id'].iloc[0])
+    user_codes, usernames = users if users is not None else pd.factorize(df['username'].astype(str))
+    conversation_id, time_diff_minutes, _ = sessionize(to_nanoseconds(df['timestamp']), user_codes, usernames,
+                                                       thresholds=thresholds, previous=previous, spec=spec)
+    df['time_diff_minutes'] = time_diff_minutes
+    df['conversation_id'] = conversation_id
+    return df
 
 
 def is_phone_numbers(username):
@@ -95,36 +162,208 @@ def is_phone_numbers(username):
 
 def is_url(messege):
     pattern = r"http\S+"
-    return bool(re.match(pattern, pattern.replace(' ', '')))
-
-
-def add_metadata_to_df(df):
-    df['timestamp'] = pd.to_datetime(df['date'])
-    df['year'] = df['timestamp'].dt.year
-    df['date'] = df['timestamp'].dt.date
-    df['hour'] = df['timestamp'].dt.floor('h').dt.strftime("%H:%M")
-    df['week'] = df['timestamp'].dt.to_period('W').dt.start_time
-    df['month'] = df['timestamp'].to_numpy().astype('datetime64[M]')
-    df['day_name'] = df['timestamp'].dt.day_name()
-    df['is_media'] = df['message'].str.contains('<Media omitted>')
-    df['text_length'] = df['message'].apply(lambda x: len(str(x).split()))
-    df['user_is_phone_number'] = df['username'].apply(lambda x: is_phone_numbers(x))
-    df['message_has_phone_number'] = df['message'].apply(lambda x: is_phone_numbers(x))
-    df['has_url'] = df['message'].apply(lambda x: is_url(x))
-    df['clean_text'] = df['message'].apply(lambda x: clean_text(x))
-    df = add_conversation_id(df)
+    return bool(re.match(pattern, messege.replace(' ', '')))
+
+
+def add_metadata_to_df(df, thresholds=None, previous=None):
+    # every column is computed over the whole chat at once: calendar columns from integer nanoseconds and once per
+    # distinct day, text columns from the UTF-8 bytes of the messages, with Arrow kernels run on the few candidates
+    dates = df['date']
+    timestamps = df['timestamp'] = dates if pd.api.types.is_datetime64_any_dtype(dates) else pd.to_datetime(dates)
+    timezone = timestamps.dt.tz
+    nanoseconds = to_nanoseconds(timestamps.dt.tz_localize(None) if timezone is not None else timestamps)
+    day_codes, day_ordinals = pd.factorize(nanoseconds // NS_PER_DAY)
+    days = pd.to_datetime(day_ordinals, unit='D')
+    df['year'] = days.year.to_numpy()[day_codes]
+    df['date'] = days.date[day_codes]
+    df['week'] = (days - pd.to_timedelta(days.dayofweek, unit='D')).to_numpy()[day_codes]
+    if timezone is None:
+        # converted to the unit pandas stores months in once per day rather than on insertion
+        df['month'] = days.to_numpy().astype('datetime64[M]').astype('datetime64[s]')[day_codes]
+    else:
+        df['month'] = timestamps.to_numpy().astype('datetime64[M]')
+    # integer time dimensions the charts count on, labels are only applied when rendering
+    df['hour'] = (nanoseconds // NS_PER_HOUR % 24).astype(np.int32)
+    df['weekday'] = days.dayofweek.to_numpy()[day_codes]
+    df['epoch_day'] = day_ordinals[day_codes]
+    df['epoch_week'] = epoch_weeks(day_ordinals)[day_codes]
+    df['epoch_month'] = epoch_months(day_ordinals)[day_codes]
+
+    messages = arrow_strings(df['message'])
+    offsets, data = utf8_buffers(messages)
+    first_bytes = np.where(offsets[:-1] < offsets[1:], data[np.minimum(offsets[:-1], max(len(data) - 1, 0))], 0)
+    # "<Media omitted>" can only be in the messages with a "<", links and phone numbers only start the messages
+    # whose first byte can start them
+    df['is_media'] = match_candidates(messages, rows_with_byte(messages, ord('<')),
+                                      lambda values: pc.match_substring(values, '<Media omitted>'))
+    df['text_length'] = count_words(messages)
+    users = pc.dictionary_encode(arrow_strings(df['username']))
+    user_codes, usernames = users.indices.to_numpy(), pd.Index(users.dictionary.to_pylist())
+    df['user_is_phone_number'] = np.array([is_phone_numbers(name) for name in usernames], dtype=bool)[user_codes]
+    df['message_has_phone_number'] = match_candidates(messages, np.flatnonzero(PHONE_NUMBER_FIRST_BYTES[first_bytes]),
+                                                      are_phone_numbers)
+    df['has_url'] = match_candidates(messages, np.flatnonzero(URL_FIRST_BYTES[first_bytes]), have_urls)
+    df = add_conversation_id(df, thresholds=thresholds, previous=previous, users=(user_codes, usernames))
     return df
 
 
+def arrow_strings(values):
+    '''Column as an Arrow string array of the strings astype(str) gives, string columns being converted directly'''
+    if not isinstance(values.dtype, pd.StringDtype):
+        return pa.array(values.astype(str), type=pa.large_string())
+    # the values of the python storage are str or NA, which Arrow takes as null
+    strings = pa.array(np.asarray(values.array) if values.dtype.storage == 'python' else values.array,
+                       type=pa.large_string(), from_pandas=True)
+    if isinstance(strings, pa.ChunkedArray):
+        strings = strings.combine_chunks()
+    return pc.fill_null(strings, str(pd.NA))
+
+
+def match_candidates(values, candidates, match):
+    '''Mask of the values of an Arrow array matched by an Arrow predicate, evaluated only on the values at candidates'''
+    mask = np.zeros(len(values), dtype=bool)
+    if len(candidates):
+        mask[candidates] = np.asarray(match(values.take(pa.array(candidates))), dtype=bool)
+    return mask
+
+
+def utf8_buffers(messages):
+    '''Offsets (int64) and UTF-8 data (uint8) of an Arrow string array, without copying them'''
+    messages = pc.cast(messages, pa.large_string())
+    offsets = np.frombuffer(messages.buffers()[1], dtype=np.int64)[messages.offset:messages.offset + len(messages) + 1]
+    data = np.frombuffer(messages.buffers()[2] or b'', dtype=np.uint8)[:offsets[-1]]
+    return offsets, data
+
+
+def text_blocks(offsets):
+    '''Ranges (first, last) of consecutive messages with about TEXT_BLOCK_BYTES of UTF-8 data, given their offsets'''
+    cuts = np.searchsorted(offsets, np.arange(TEXT_BLOCK_BYTES, offsets[-1], TEXT_BLOCK_BYTES))
+    bounds = np.unique(np.concatenate([[0], cuts, [len(offsets) - 1]]))
+    return zip(bounds[:-1], bounds[1:])
+
+
+def rows_with_byte(messages, byte):
+    '''Rows of the messages of an Arrow string array with a given byte in their UTF-8 data'''
+    offsets, data = utf8_buffers(messages)
+    return rows_of_positions(offsets, [offsets[first] + np.flatnonzero(data[offsets[first]:offsets[last]] == byte)
+                                       for first, last in text_blocks(offsets)])
+
+
+def rows_of_positions(offsets, positions):
+    '''Distinct rows, in order, of sorted positions in the UTF-8 data of messages given their offsets'''
+    rows = np.searchsorted(offsets, np.concatenate([np.empty(0, dtype=np.int64)] + positions), 'right') - 1
+    return rows[np.diff(rows, prepend=-1) > 0]
+
+
+def count_words(messages):
+    '''Number of whitespace separated words of every message of an Arrow string array, like len(x.split())'''
+    # words are counted on the UTF-8 data as runs of bytes above the space, the few messages with other whitespace or
+    # with control characters that are not whitespace are then counted again by an Arrow regex
+    offsets, data = utf8_buffers(messages)
+    counts = np.zeros(len(offsets) - 1, dtype=np.int64)
+    unusual = []
+    for first, last in text_blocks(offsets):
+        start = offsets[first]
+        block = data[start:offsets[last]]
+        counts[first:last] = count_block_words(offsets[first:last + 1] - start, block)
+        candidates = np.flatnonzero((block < 28) | (block >= 0xC2))
+        unusual.append(start + candidates[EXACT_WORD_COUNT_BYTES[block[candidates]]])
+    rows = rows_of_positions(offsets, unusual)
+    if len(rows):
+        words = pc.count_substring_regex(messages.take(pa.array(rows)), f'[^{PYTHON_WHITESPACE}]+')
+        counts[rows] = words.to_numpy()
+    return counts
+
+
+def count_block_words(offsets, data):
+    '''Number of runs of bytes above the space of every message of a block of UTF-8 data, given their offsets'''
+    is_space = data <= 32
+    # a word starts at a byte above the space that starts a message or follows a byte up to the space
+    follows_space = np.empty_like(is_space)
+    follows_space[1:] = is_space[:-1]
+    non_empty = offsets[:-1] < offsets[1:]
+    message_starts = offsets[:-1][non_empty]
+    follows_space[message_starts] = True
+    counts = np.zeros(len(offsets) - 1, dtype=np.int64)
+    if len(message_starts):
+        counts[non_empty] = np.add.reduceat(follows_space & ~is_space, message_starts, dtype=np.int64)
+    return counts
+
+
+def are_phone_numbers(values):
+    '''Vectorized is_phone_numbers over an Arrow string array'''
+    # the lookaheads of is_phone_numbers are not supported by Arrow regexes: the character class is matched over
+    # all values, the required digit, "-" and "+" are then checked on the few candidates
+    mask = pc.match_substring_regex(values, r'^[0-9\-+ ]+\n? *$').to_numpy(zero_copy_only=False)
+    candidates = np.flatnonzero(mask)
+    if len(candidates):
+        values = values.take(candidates)
+        checks = [pc.match_substring_regex(values, '[0-9]'), pc.match_substring(values, '-'), pc.match_substring(values, '+')]
+        mask[candidates] = np.logical_and.reduce([check.to_numpy(zero_copy_only=False) for check in checks])
+    return mask
+
+
+def have_urls(messages):
+    '''Vectorized is_url: whether each message of an Arrow string array, spaces removed, starts with a link'''
+    return pc.match_substring_regex(messages, f'^ *h *t *t *p *[^{PYTHON_WHITESPACE}]').to_numpy(zero_copy_only=False)
+
+
+def append_to_enriched_df(df, tail, thresholds):
+    '''Enriches messages appended to an already enriched chat and adds them to it, keeping it sorted by timestamp'''
+    # the last known message is the last row of the sorted frame, the largest index only numbers the new rows
+    previous = df.iloc[[-1]]
+    next_index = df.index.max() + 1
+    tail = add_metadata_to_df(tail.set_axis(range(next_index, next_index + len(tail))),
+                              thresholds=thresholds, previous=previous)
+    # the gap after the last known message is only known now
+    df = df.copy()
+    gap = tail['timestamp'].min() - previous['timestamp'].iloc[0]
+    df.iloc[-1, df.columns.get_loc('time_diff_minutes')] = gap / pd.Timedelta(minutes=1)
+    return pd.concat([df, tail]).sort_values('timestamp', kind='stable')
+
+
+def compact_chat_df(df):
+    '''Returns an enriched chat with a compact memory layout: categories, small ints, bools and Arrow strings'''
+    columns = {}
+    for column in df:
+        dtype = COMPACT_DTYPES.get(column)
+        values = df[column]
+        if dtype == 'bool':
+            values = values.astype('boolean').fillna(False)
+        columns[column] = values.astype(dtype) if dtype is not None else values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_report(before, after):
+    '''Memory used by every column of a chat before and after compact_chat_df, in MB'''
+    report = pd.DataFrame({'dtype_before': before.dtypes.astype(str),
+                           'mb_before': before.memory_usage(index=False, deep=True) / 1e6,
+                           'dtype_after': after.dtypes.astype(str),
+                           'mb_after': after.memory_usage(index=False, deep=True) / 1e6})
+    report.loc['total'] = ['', report['mb_before'].sum(), '', report['mb_after'].sum()]
+    return report
+
+
 def time_filter_change():
     st.session_state['time_filter'] = st.session_state.time_filter
 
 
-def add_filters(add_side_filters=True):
+def get_filter_index():
+    '''Filter index of the session chat, built once per dataset and kept with the other derived columns'''
+    derived_columns = st.session_state.setdefault('derived_columns', {})
+    key = ('filter_index', st.session_state.get('dataset_id'))
+    if key not in derived_columns:
+        derived_columns[key] = build_filter_index(st.session_state['data'])
+    return derived_columns[key]
+
 
+def add_filters(add_side_filters=True, frame=True):
+    # with frame=False only the filter state is set, for pages that only read aggregates memoized for it, and None
+    # is returned in place of the filtered chat
     if add_side_filters:
-        min_date = st.session_state['data']['date'].min()
-        max_date = st.session_state['data']['date'].max()
+        filter_index = get_filter_index()
+        min_date = filter_index['min_date']
+        max_date = filter_index['max_date']
         if min_date == max_date:
             max_date = max_date + timedelta(days=1)
 
@@ -136,34 +375,225 @@ def add_filters(add_side_filters=True):
 
         st.sidebar.write('')
 
-        data_year = st.sidebar.multiselect("Year", ["All"] + list(st.session_state['data']['year'].astype(int).unique()),
-                                           default='All')
+        data_year = st.sidebar.multiselect("Year", ["All"] + filter_index['years'], default='All')
 
         time_filter = st.sidebar.slider("Time Period", min_date, max_date, (current_min_date, current_max_date),
                                         key='time_filter', on_change=time_filter_change)
 
         st.sidebar.write('')
 
-        users_filter = st.sidebar.multiselect("User", ["All"] + list(st.session_state['data']['username'].unique()),
-                                              default='All')
-
-        if "All" in users_filter or not users_filter:
-            filtered_df = st.session_state['data']
-        else:
-            filtered_df = st.session_state['data'][st.session_state['data']['username'].isin(users_filter)]
-
-        if "All" in data_year or not data_year:
-            pass
-        else:
-            filtered_df = filtered_df[filtered_df['year'].astype(int).isin(data_year)]
+        users_filter = st.sidebar.multiselect("User", ["All"] + filter_index['users'], default='All')
 
         language = app_language()
 
-        return filtered_df[filtered_df['date'].between(time_filter[0], time_filter[1])], time_filter[0], time_filter[1], language
+        # the selection is kept for what is computed from the conversation table rather than from filtered_df
+        st.session_state['filters'] = {
+            'users': None if "All" in users_filter or not users_filter else list(users_filter),
+            'years': None if "All" in data_year or not data_year else list(data_year),
+        }
+        set_filter_signature(time_filter[0], time_filter[1])
+        return get_filtered_df() if frame else None, time_filter[0], time_filter[1], language
 
     else:
         language = app_language()
-        return st.session_state['data'], None, None, language
+        st.session_state['filters'] = {'users': None, 'years': None}
+        set_filter_signature(None, None)
+        return get_filtered_df() if frame else None, None, None, language
+
+
+def set_filter_signature(min_date, max_date):
+    '''Makes the current filters the canonical key of what is memoized for them: dataset, years, dates and users'''
+    filters = st.session_state['filters']
+    st.session_state['filter_signature'] = (
+        st.session_state.get('dataset_id'),
+        tuple(sorted(int(year) for year in filters['years'])) if filters['years'] else None,
+        (min_date, max_date),
+        tuple(sorted(filters['users'])) if filters['users'] else None,
+    )
+
+
+def filter_memo():
+    '''Results memoized per filter state, shared by all the pages of the session'''
+    if 'filter_memo' not in st.session_state:
+        st.session_state['filter_memo'] = new_memo()
+    return st.session_state['filter_memo']
+
+
+def filtered_selection():
+    '''Rows of the session chat selected by the current filters and the frame of these rows, memoized for the filter state'''
+    signature = st.session_state['filter_signature']
+    _, years, (min_date, max_date), users = signature
+
+    def select():
+        # rows are located through the filter index, a date range alone is a slice of the chat sorted by time
+        rows = select_rows(get_filter_index(), min_date, max_date, users=users and list(users),
+                           years=years and list(years))
+        return rows, st.session_state['data'].iloc[rows]
+
+    rows, filtered_df = memoized(filter_memo(), (signature, 'filtered_df'), select)
+    st.session_state['filter_rows'] = rows
+    return rows, filtered_df
+
+
+def get_filtered_df():
+    '''Rows of the session chat selected by the current filters, memoized for the filter state'''
+    return filtered_selection()[1]
+
+
+def aggregate_key(function, args, kwargs):
+    '''Memo key of the result of function with args and kwargs for the current filter state'''
+    return (st.session_state['filter_signature'], function.__module__, function.__qualname__, args,
+            tuple(sorted(kwargs.items())))
+
+
+def filtered_aggregate(function, *args, **kwargs):
+    '''Returns function(filtered chat, *args, **kwargs), memoized for the filter state across pages and reruns.
+
+    The result is shared and must not be modified. args and kwargs are part of the key and must be hashable.
+    '''
+    return memoized(filter_memo(), aggregate_key(function, args, kwargs),
+                    lambda: function(get_filtered_df(), *args, **kwargs))
+
+
+def get_text_filtered_df(text):
+    '''Messages of the filtered chat containing text (ignoring case), memoized for the filter state'''
+    text = text.lower()
+
+    def select():
+        filtered_df = get_filtered_df()
+        return filtered_df[filtered_df['message'].str.lower().str.contains(text)]
+
+    return memoized(filter_memo(), (st.session_state['filter_signature'], 'text_filtered_df', text), select)
+
+
+def text_filtered_aggregate(text, function, *args, **kwargs):
+    '''Like filtered_aggregate, over the messages of the filtered chat containing text'''
+    key = ('text', text.lower()) + aggregate_key(function, args, kwargs)
+    return memoized(filter_memo(), key, lambda: function(get_text_filtered_df(text), *args, **kwargs))
+
+
+def lazy_tabs(labels, key):
+    '''Tabs whose body is only run while they are selected: a (tab, selected) pair for every label.
+
+    Selecting a tab reruns the page, so the charts of a tab are computed (or read from the filter memo) once it is
+    opened instead of on every rerun of every tab.
+    '''
+    tabs = st.tabs(labels, key=key, on_change='rerun')
+    return [(tab, tab.open) for tab in tabs]
+
+
+def get_activity_cube():
+    '''Activity cube of the session chat, built once per dataset (at ingest) and kept with the derived columns'''
+    derived_columns = st.session_state.setdefault('derived_columns', {})
+    key = ('activity_cube', st.session_state.get('dataset_id'))
+    if key not in derived_columns:
+        derived_columns[key] = build_activity_cube(st.session_state['data'])
+    return derived_columns[key]
+
+
+def cube_aggregate(function, *args, **kwargs):
+    '''Like filtered_aggregate, but function gets the cells of the activity cube selected by the filters'''
+    signature = st.session_state['filter_signature']
+    _, years, (min_date, max_date), users = signature
+
+    def select():
+        return select_cube(get_activity_cube(), min_date, max_date, users=users and list(users),
+                           years=years and list(years))
+
+    def compute():
+        return function(memoized(filter_memo(), (signature, 'activity_cube'), select), *args, **kwargs)
+
+    key = ('cube',) + aggregate_key(function, args, kwargs)
+    return memoized(filter_memo(), key, compute)
+
+
+def weekly_aggregate(function, *args, **kwargs):
+    '''Like cube_aggregate, but function gets the 7 x 24 matrix of the messages by weekday and hour of the filters.
+
+    The matrix sums the user slices of a user x weekday x hour tensor of the selected dates and years, memoized apart
+    from the user filter: selecting users adds up slices instead of regrouping the activity cube.
+    '''
+    signature = st.session_state['filter_signature']
+    dataset_id, years, (min_date, max_date), users = signature
+
+    def tensor():
+        cells = select_cube(get_activity_cube(), min_date, max_date, years=years and list(years))
+        usernames = cells['username'].cat.categories
+        return list(usernames), weekly_activity(cells['weekday'], cells['hour'], cells['username'].cat.codes,
+                                                len(usernames), cells['n_messages'].to_numpy())
+
+    def matrix():
+        usernames, activity = memoized(filter_memo(), ((dataset_id, years, (min_date, max_date)), 'weekly_activity'),
+                                       tensor)
+        if not users:
+            return activity.sum(axis=0)
+        codes = pd.Index(usernames).get_indexer(list(users))
+        return activity[codes[codes >= 0]].sum(axis=0)
+
+    def compute():
+        return function(memoized(filter_memo(), (signature, 'weekly_matrix'), matrix), *args, **kwargs)
+
+    return memoized(filter_memo(), ('weekly',) + aggregate_key(function, args, kwargs), compute)
+
+
+def interactions_aggregate(function, *args, **kwargs):
+    '''Like filtered_aggregate, but function gets the messages and replies of the users of the filtered chat'''
+    signature = st.session_state['filter_signature']
+
+    def select():
+        index = get_filter_index()
+        return chat_interactions(index['user_codes'], filtered_selection()[0], index['users'])
+
+    def compute():
+        return function(memoized(filter_memo(), (signature, 'interactions'), select), *args, **kwargs)
+
+    return memoized(filter_memo(), ('interactions',) + aggregate_key(function, args, kwargs), compute)
+
+
+def get_reply_latencies():
+    '''Reply delay histograms of the session chat, built once per dataset and kept with the derived columns'''
+    derived_columns = st.session_state.setdefault('derived_columns', {})
+    key = ('reply_latencies', st.session_state.get('dataset_id'))
+    if key not in derived_columns:
+        derived_columns[key] = build_reply_latencies(st.session_state['data'])
+    return derived_columns[key]
+
+
+def latency_aggregate(function, *args, **kwargs):
+    '''Like filtered_aggregate, but function gets the reply delay histograms of the replies selected by the filters'''
+    signature = st.session_state['filter_signature']
+    _, years, (min_date, max_date), users = signature
+
+    def select():
+        return select_reply_latencies(get_reply_latencies(), min_date, max_date, users=users and list(users),
+                                      years=years and list(years))
+
+    def compute():
+        return function(memoized(filter_memo(), (signature, 'reply_latencies'), select), *args, **kwargs)
+
+    return memoized(filter_memo(), ('latency',) + aggregate_key(function, args, kwargs), compute)
+
+
+def count_users(df):
+    return df['username'].nunique()
+
+
+def count_days(df):
+    return df['epoch_day'].nunique()
+
+
+def get_conversations(min_date=None, max_date=None):
+    '''Conversations of the session chat selected by the sidebar filters, and their selected participants.
+
+    The conversation tables are built once per dataset and kept with the other derived columns.
+    '''
+    derived_columns = st.session_state.setdefault('derived_columns', {})
+    key = ('conversations', st.session_state.get('dataset_id'))
+    if key not in derived_columns:
+        derived_columns[key] = conversation_tables(st.session_state['data'])
+    filters = st.session_state.get('filters', {})
+    return select_conversations(*derived_columns[key], users=filters.get('users'), years=filters.get('years'),
+                                min_date=min_date, max_date=max_date)
 
 def get_locations_markers(df):
     locations_df = df[(df['message'].str.contains('maps.google.com')) &
@@ -1,26 +1,33 @@
+import colorsys
+import os
+
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import altair as alt
-from whatstk import WhatsAppChat
-from whatstk.graph import FigureBuilder
 
-DAYS_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+from utils.interaction_utils import top_interactions
+from utils.latency_utils import format_duration, pair_reply_latencies, user_reply_latencies
+from utils.time_utils import DAY_NAMES, HOUR_LABELS, TIME_ORDINALS, count_by_ordinal, date_ordinal, ordinal_dates, roll_up
+
 DAYS_RU_DICT = {"Monday":"Понедельник", "Tuesday":"Вторник", "Wednesday":"Среда",
                  "Thursday":"Четверг", "Friday":"Пятница", "Saturday":"Суббота", "Sunday":"Воскресенье"}
-DAYS_ORDER_LANG_DICT = {'en': DAYS_ORDER, 'ru': DAYS_ORDER}
+DAYS_ORDER_LANG_DICT = {'en': DAY_NAMES, 'ru': [DAYS_RU_DICT[day] for day in DAY_NAMES]}
 
 OTHER_DICT = {'en': "Other", "ru": "Прочие"}
 
+# Time series traces longer than this are downsampled before being sent to the browser (0 keeps every point), and
+# figures with more points than WEBGL_MIN_POINTS are drawn with WebGL instead of SVG
+SERIES_MAX_POINTS = int(os.environ.get('CHAT_ANALYZER_SERIES_MAX_POINTS', 1000))
+WEBGL_MIN_POINTS = int(os.environ.get('CHAT_ANALYZER_WEBGL_MIN_POINTS', 2000))
+
 INTERACTION_NOTE_DICT = {
     'en': 'A response from user X to user Y happens if user X sends a message right after a message from user Y',
     'ru': "Ответ от пользователя X пользователю Y произойдет, если пользователь X отправит сообщение сразу после сообщения от пользователя Y"
     }
 
-HOURS_ORDER = pd.date_range('1970-01-01', '1970-01-02', freq='H').strftime("%H:%M")
 
-
-FREQ_DICT = {'date': '1D', 'month': 'MS', 'week': 'W-MON'}
 def generate_geo_barchart(df, language='en', geo_key='city', top_n=10):
 
     xaxis_lang_dict = {'en': '% of locations', 'ru': '% локаций'}
@@ -61,6 +68,23 @@ def generate_geo_piehart(df, language='en',top_n=10):
     return fig
 
 
+def message_weights(df):
+    '''Messages each row of df stands for: None (one each) for messages, their counts for activity cube cells'''
+    return df['n_messages'].to_numpy() if 'n_messages' in df else None
+
+
+def count_messages(df):
+    '''Number of messages of df (messages or activity cube cells)'''
+    return len(df) if 'n_messages' not in df else int(df['n_messages'].sum())
+
+
+def user_message_counts(df):
+    '''Number of messages of every user of df (messages or activity cube cells), most active first'''
+    if 'n_messages' in df:
+        return df.groupby('username', observed=True)['n_messages'].sum().sort_values(ascending=False, kind='stable')
+    return df['username'].value_counts()
+
+
 def generate_piechart(df, language='en', top_n=10):
     if not df.empty:
         username_text = {'en': 'Username', 'ru': "Имя пользователя"}
@@ -68,9 +92,11 @@ def generate_piechart(df, language='en', top_n=10):
         messages_text = {'en': '% of messages', 'ru': "% сообщений"}
         plot_title = {'en': 'Messages share by username', 'ru': "Распределение сообщений по имени пользователя"}
 
-        top_n = min(top_n, df["username"].nunique())
+        shares = user_message_counts(df)
+        shares = shares[shares > 0] / shares.sum()
+        top_n = min(top_n, len(shares))
 
-        agg_df = df["username"].value_counts(normalize=True)[0:top_n].reset_index()
+        agg_df = pd.DataFrame({'index': shares.index[0:top_n].astype(str), 'username': shares.values[0:top_n]})
 
         agg_df = agg_df._append(pd.DataFrame(data=[[1-agg_df["username"].sum(), other_text[language]]],
                                             columns=["username", "index"]))\
@@ -91,16 +117,58 @@ def generate_piechart(df, language='en', top_n=10):
         return go.Figure()
 
 
-def fix_empty_activity_df(agg_df,df,granularity,unit,unit_dict,unit_lan_dict,language,granularity_lan_dict):
-    if agg_df.empty:
-        agg_df = df.groupby(granularity).agg({'username': unit_dict[unit]}).reset_index() \
-            .rename(columns={'username': f'# {unit_lan_dict[language][unit]}',
-                             granularity: granularity_lan_dict[language][granularity].capitalize()})
-    return agg_df
-
-
-def generate_activity_overtime(df, min_date, max_date, language='en', unit='Messages', granularity='month'):
-    unit_dict = {'Messages': 'count', 'Users': 'nunique'}
+def activity_range(df, granularity, min_date, max_date):
+    '''First and last ordinal of the days, weeks or months from min_date to max_date (or over df without dates)'''
+    if min_date is None or max_date is None:
+        ordinals = df[TIME_ORDINALS[granularity]]
+        return (int(ordinals.min()), int(ordinals.max())) if len(ordinals) else (0, -1)
+    return date_ordinal(granularity, min_date), date_ordinal(granularity, max_date)
+
+
+def lttb_indices(values, max_points=SERIES_MAX_POINTS):
+    '''Positions of the points of a series kept by largest-triangle-three-buckets downsampling to max_points.
+
+    The points are taken as evenly spaced. Every bucket keeps the point forming the largest triangle with the point
+    kept before it and the average of the next bucket; the highest and lowest points are kept as well, so the peaks
+    of activity survive. Series of at most max_points points (or max_points below 3) are kept whole.
+    '''
+    n_points = len(values)
+    if max_points < 3 or n_points <= max_points:
+        return np.arange(n_points)
+    values = np.asarray(values, dtype=float)
+    # max_points - 2 buckets between the first and the last points, which are always kept
+    edges = np.linspace(1, n_points - 1, max_points - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    averages_x = edges[:-1] + (sizes - 1) / 2
+    averages_y = np.add.reduceat(values[1:n_points - 1], edges[:-1] - 1) / sizes
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n_points - 1
+    previous = 0
+    for bucket, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        if bucket + 1 < len(sizes):
+            next_x, next_y = averages_x[bucket + 1], averages_y[bucket + 1]
+        else:
+            next_x, next_y = n_points - 1, values[-1]
+        areas = np.abs((previous - next_x) * (values[start:end] - values[previous]) -
+                       (previous - np.arange(start, end)) * (next_y - values[previous]))
+        previous = start + int(areas.argmax())
+        kept[bucket + 1] = previous
+    return np.union1d(kept, [values.argmax(), values.argmin()])
+
+
+def downsample_series(counts, max_points=SERIES_MAX_POINTS):
+    '''Kept positions of every row of counts (one series per row)'''
+    return [lttb_indices(row, max_points) for row in counts]
+
+
+def line_render_mode(n_points):
+    '''WebGL for figures of many points, SVG otherwise'''
+    return 'webgl' if n_points > WEBGL_MIN_POINTS else 'svg'
+
+
+def generate_activity_overtime(df, min_date, max_date, language='en', unit='Messages', granularity='month',
+                               max_points=SERIES_MAX_POINTS):
     unit_lan_dict = {"ru": {'Messages': 'Сообщения', 'Users': 'Пользователи'},
                      "en": {'Messages': 'Messages', 'Users': 'Users'}}
     granularity_lan_dict = {"ru": {'month': 'месяц', 'week': 'неделя', 'date': 'день'},
@@ -108,14 +176,21 @@ def generate_activity_overtime(df, min_date, max_date, language='en', unit='Mess
 
     plot_title = {'en': 'Overall chat activity over time', 'ru': "Общая активность чата с течением времени"}
 
-    agg_df = df.groupby(granularity).agg({'username': unit_dict[unit]}) \
-        .reindex(pd.date_range(min_date, max_date, freq=FREQ_DICT[granularity]), fill_value=0).reset_index() \
-        .rename(columns={'username': f'# {unit_lan_dict[language][unit]}', 'index': granularity_lan_dict[language][granularity].capitalize()})
-
-    agg_df = fix_empty_activity_df(agg_df, df, granularity, unit, unit_dict, unit_lan_dict, language, granularity_lan_dict)
-
-    fig = px.line(agg_df, x=granularity_lan_dict[language][granularity].capitalize(),
-                  y=f'# {unit_lan_dict[language][unit]}')
+    first, last = activity_range(df, granularity, min_date, max_date)
+    ordinals = df[TIME_ORDINALS[granularity]].to_numpy()
+    weights = message_weights(df)
+    if unit == 'Users':
+        # every (period, user) pair counts once
+        user_codes, usernames = pd.factorize(df['username'])
+        ordinals = np.unique(ordinals.astype(np.int64) * max(len(usernames), 1) + user_codes) // max(len(usernames), 1)
+        weights = None
+
+    x_title, y_title = granularity_lan_dict[language][granularity].capitalize(), f'# {unit_lan_dict[language][unit]}'
+    counts = count_by_ordinal(ordinals, first, last, weights=weights)[0]
+    kept = lttb_indices(counts, max_points)
+    agg_df = pd.DataFrame({x_title: ordinal_dates(granularity, first + kept), y_title: counts[kept]})
+
+    fig = px.line(agg_df, x=x_title, y=y_title, render_mode=line_render_mode(len(agg_df)))
     fig['data'][0]['line']['color'] = "#24d366"
     fig.update_layout(paper_bgcolor="rgba(18,32,43)", plot_bgcolor="rgba(18,32,43)", hovermode="x",
                       title_text=plot_title[language])
@@ -123,53 +198,73 @@ def generate_activity_overtime(df, min_date, max_date, language='en', unit='Mess
     return fig
 
 
-def generate_users_activity_overtime(df, min_date, max_date, language='en', granularity='month',top_n=5):
-    if not df.empty:
-        granularity_lan_dict = {"ru": {'month': 'месяц', 'week': 'неделя', 'date': 'день'},
-                                'en': {'month': 'month', 'week': 'week', 'date': 'day'}}
-        messages_lang_dict = {'en': '# of messages', 'ru': "# сообщений"}
-        username_lang_dict = {'en': 'Username', 'ru': "Имя пользователя"}
-        plot_title = {'en': 'Users activity over time (top %s)', 'ru': "Активность пользователей с течением времени (топ %s)"}
-
-        top_n = min(top_n, df["username"].nunique())
-
-        users_dfs = []
-
-        users = df["username"].value_counts(normalize=True)[0:top_n].index
+def users_daily_activity(df, min_date, max_date, top_n=5):
+    '''Messages of the top_n most active users of df on every day from min_date to max_date (or over df without dates).
 
-        for user in users:
-            user_df = df[df['username'] == user].groupby([granularity]) \
-                .agg(n_messages=('username', "count")) \
-                .reindex(pd.date_range(min_date, max_date, freq=FREQ_DICT[granularity]), fill_value=0).reset_index()
-            user_df['username'] = user
-            users_dfs.append(user_df)
+    One bincount over the (user, day) of the rows of the top users, whatever their number.
+    Returns the users, the epoch day of the first column and an array with a row for every user.
+    '''
+    user_counts = user_message_counts(df)
+    users = user_counts[user_counts > 0].index[0:top_n]
+    first, last = activity_range(df, 'date', min_date, max_date)
+    user_codes = pd.Index(users).get_indexer(df['username'])
+    is_top = user_codes >= 0
+    weights = message_weights(df)
+    counts = count_by_ordinal(df['epoch_day'].to_numpy()[is_top], first, last, groups=user_codes[is_top],
+                              n_groups=len(users), weights=None if weights is None else weights[is_top])
+    return users, first, counts
 
-        agg_df = pd.concat(users_dfs, ignore_index=True)\
-            .rename(columns={'n_messages': messages_lang_dict[language],
-                             'index': granularity_lan_dict[language][granularity].capitalize(),
-                             'username': username_lang_dict[language]})
 
-        fig = px.line(agg_df, x=granularity_lan_dict[language][granularity].capitalize(), y=messages_lang_dict[language],
-                      color=username_lang_dict[language])
+def generate_users_activity_charts(df, min_date, max_date, language='en', top_n=5,
+                                   granularities=('month', 'week', 'date'), max_points=SERIES_MAX_POINTS):
+    '''Users activity over time charts of every granularity, rolled up from a single daily aggregate'''
+    if df.empty:
+        return {granularity: go.Figure() for granularity in granularities}
 
-        fig.update_layout(title_text=plot_title[language] % top_n)
+    granularity_lan_dict = {"ru": {'month': 'месяц', 'week': 'неделя', 'date': 'день'},
+                            'en': {'month': 'month', 'week': 'week', 'date': 'day'}}
+    messages_lang_dict = {'en': '# of messages', 'ru': "# сообщений"}
+    username_lang_dict = {'en': 'Username', 'ru': "Имя пользователя"}
+    plot_title = {'en': 'Users activity over time (top %s)', 'ru': "Активность пользователей с течением времени (топ %s)"}
+
+    users, first_day, daily_counts = users_daily_activity(df, min_date, max_date, top_n)
+    charts = {}
+    for granularity in granularities:
+        first, counts = roll_up(daily_counts, first_day, granularity)
+        x_title = granularity_lan_dict[language][granularity].capitalize()
+        kept = downsample_series(counts, max_points)
+
+        agg_df = pd.DataFrame({x_title: ordinal_dates(granularity, first + np.concatenate(kept)),
+                               messages_lang_dict[language]: np.concatenate([row[positions] for row, positions
+                                                                             in zip(counts, kept)]),
+                               username_lang_dict[language]: np.repeat(np.asarray(users, dtype=object),
+                                                                       [len(positions) for positions in kept])})
+
+        fig = px.line(agg_df, x=x_title, y=messages_lang_dict[language], color=username_lang_dict[language],
+                      render_mode=line_render_mode(len(agg_df)))
+
+        fig.update_layout(title_text=plot_title[language] % len(users))
         fig.update_layout(paper_bgcolor="rgba(18,32,43)", plot_bgcolor="rgba(18,32,43)")
         fig.update_layout(hovermode="x")
         fig.update_traces(mode='markers+lines')
-        return fig
-    else:
-        return go.Figure()
+        charts[granularity] = fig
+    return charts
+
 
+def generate_users_activity_overtime(df, min_date, max_date, language='en', granularity='month',top_n=5,
+                                     max_points=SERIES_MAX_POINTS):
+    return generate_users_activity_charts(df, min_date, max_date, language, top_n, (granularity,),
+                                          max_points)[granularity]
 
-def generate_hourly_activity(df, language='en'):
+
+def generate_hourly_activity(matrix, language='en'):
 
     xaxis_lang_dict = {'en': "Hour of day", 'ru': "Время суток"}
     yaxis_lang_dict = {'en': "% of activity", 'ru': "% от активности"}
     title_lang_dict = {'en': 'Activity by hour of day', 'ru': "Активность по времени суток"}
 
-    fig = px.bar(df['hour'].value_counts(normalize=True).sort_index().reset_index()\
-                 .rename(columns={'hour': yaxis_lang_dict[language],
-                                  'index': xaxis_lang_dict[language]}),
+    share = matrix.sum(axis=0) / max(matrix.sum(), 1)
+    fig = px.bar(pd.DataFrame({xaxis_lang_dict[language]: HOUR_LABELS, yaxis_lang_dict[language]: share}),
                  x=xaxis_lang_dict[language], y=yaxis_lang_dict[language])
 
     fig.update_traces(marker_color="#24d366")
@@ -182,22 +277,15 @@ def generate_hourly_activity(df, language='en'):
     return fig
 
 
-def generate_day_of_week_activity(df, language='en'):
+def generate_day_of_week_activity(matrix, language='en'):
 
     yaxis_lang_dict = {'en': "Day of week", 'ru': "День недели"}
     xaxis_lang_dict = {'en': "% of activity", 'ru': "% от активности"}
     title_lang_dict = {'en': 'Activity by day of week', 'ru': "Активность по дню недели"}
 
-    agg_df = df['day_name'].value_counts(normalize=True)
-
-    missing_days = set(DAYS_ORDER_EN) - set(agg_df.index)
-    if len(missing_days) > 0:
-        agg_df = pd.concat([agg_df, pd.Series(data=[0]*len(missing_days), index=missing_days, name='day_name')])
-
-    agg_df = agg_df[DAYS_ORDER_LANG_DICT[language]].reset_index()
-    if language == 'ru':
-        agg_df['index'] = agg_df['index'].map(DAYS_RU_DICT)
-    fig = px.bar(agg_df.rename(columns={'day_name': xaxis_lang_dict[language], 'index': yaxis_lang_dict[language]}),
+    share = matrix.sum(axis=1) / max(matrix.sum(), 1)
+    fig = px.bar(pd.DataFrame({yaxis_lang_dict[language]: DAYS_ORDER_LANG_DICT[language],
+                               xaxis_lang_dict[language]: share}),
                  x=yaxis_lang_dict[language], y=xaxis_lang_dict[language])
 
     fig.update_traces(marker_color="#24d366")
@@ -210,24 +298,13 @@ def generate_day_of_week_activity(df, language='en'):
     return fig
 
 
-def generate_activity_matrix(df, language='en'):
+def generate_activity_matrix(matrix, language='en'):
 
     xaxis_lang_dict = {'en': "Hour", 'ru': "Час"}
     yaxis_lang_dict = {'en': "Day", 'ru': "День"}
     title_lang_dict = {'en': 'Message distribution by day and hour', 'ru': "Распределение сообщений по дню и часу"}
 
-    matrix_df = df.groupby(['day_name', 'hour'], as_index=False).agg(n_message=('username', 'count')) \
-        .rename(columns={'day_name': 'Day',
-                         'hour': 'Hour'})\
-        .pivot(index='Day', columns='Hour', values='n_message') / len(df)
-
-    matrix_df = matrix_df.reindex(DAYS_ORDER_LANG_DICT[language])
-    if language=='ru':
-        matrix_df.index = matrix_df.index.map(DAYS_RU_DICT)
-    for col in HOURS_ORDER:
-        if col not in matrix_df:
-            matrix_df[col] = 0
-    matrix_df = matrix_df[HOURS_ORDER].fillna(0)
+    matrix_df = pd.DataFrame(matrix / max(matrix.sum(), 1), index=DAYS_ORDER_LANG_DICT[language], columns=HOUR_LABELS)
 
     fig = go.Figure(data=go.Heatmap(
         z=matrix_df.values,
@@ -243,28 +320,48 @@ def generate_activity_matrix(df, language='en'):
     return fig
 
 
-def generate_message_responses_flow(df, language='en', n_users=5):
+def hls_palette(n_colors):
+    '''Hex codes of n_colors colors evenly spaced in hue, the palette of the interaction charts'''
+    hues = (np.linspace(0, 1, n_colors + 1)[:-1] + 0.01) % 1
+    return ["#" + "".join("%02X" % int(round(channel * 255)) for channel in colorsys.hls_to_rgb(hue, 0.6, 0.65))
+            for hue in hues]
+
+
+def generate_message_responses_flow(interactions, language='en', n_users=5):
 
     title_lang_dict = {'en': f'Message flow (top {n_users})', 'ru': f'Поток сообщений (топ {n_users})'}
+    senders_lang_dict = {'en': 'Senders', 'ru': 'Отправители'}
+    receivers_lang_dict = {'en': 'Receivers', 'ru': 'Получатели'}
+
+    users, replies = top_interactions(interactions, n_users)
+    n_top = len(users)
+    fig = go.Figure(go.Sankey(
+        arrangement="fixed", orientation="v", valueformat=".0f",
+        node=dict(pad=20, thickness=40, line=dict(color="black", width=0), label=users * 2,
+                  color=hls_palette(n_top) * 2,
+                  hovertemplate="%{label}<br>Number of messages: %{value}<extra></extra>"),
+        link=dict(source=np.repeat(np.arange(n_top), n_top), target=np.tile(np.arange(n_top, 2 * n_top), n_top),
+                  value=replies.ravel(), hovertemplate="%{source.label} ---> %{target.label}<extra>%{value}</extra>")))
 
-    fig = FigureBuilder(chat=WhatsAppChat(
-        df[df['username'].isin(df['username'].value_counts()[0: n_users].index)]))\
-        .user_message_responses_flow(title_lang_dict[language])
+    fig.update_layout(title_text=title_lang_dict[language])
+    for text, y in ((senders_lang_dict[language], 1.1), (receivers_lang_dict[language], -0.1)):
+        fig.add_annotation(text=text, font=dict(size=13, color="rgb(116, 101, 130)"), showarrow=False, align="center",
+                           x=0.5, y=y, xref="paper", yref="paper")
     fig.update_layout(paper_bgcolor="rgba(18,32,43)", plot_bgcolor="rgba(18,32,43)")
     fig.add_annotation(showarrow=False, text=INTERACTION_NOTE_DICT[language], font=dict(size=10),
                        xref='x domain', x=0, yref='y domain', y=-0.3)
     return fig
 
 
-def user_message_responses_heatmap(df, language='en', n_users=10):
+def user_message_responses_heatmap(interactions, language='en', n_users=10):
 
     title_lang_dict = {'en': f'Message flow (top {n_users})', 'ru': f'Поток сообщений (топ {n_users})'}
     xaxis_lang_dict = {'en': 'Receiver', 'ru': 'Получатель'}
     yaxis_lang_dict = {'en': 'Sender', 'ru': 'Отправитель'}
 
-    fig = FigureBuilder(chat=WhatsAppChat(
-        df[df['username'].isin(df['username'].value_counts()[0: n_users].index)]))\
-        .user_message_responses_heatmap(title=title_lang_dict[language])
+    users, replies = top_interactions(interactions, n_users)
+    fig = go.Figure(go.Heatmap(z=replies, x=users, y=users, colorscale="Greens"))
+    fig.update_layout(title_text=title_lang_dict[language])
     fig.update_layout(paper_bgcolor="rgba(18,32,43)", plot_bgcolor="rgba(18,32,43)", )
     fig.update_traces(name="", hovertemplate="Day: %{y}---> %{x}:  %{z:,}")
     fig.add_annotation(showarrow=False, text=INTERACTION_NOTE_DICT[language], font=dict(size=10), xref='x domain',
@@ -275,6 +372,45 @@ def user_message_responses_heatmap(df, language='en', n_users=10):
     return fig
 
 
+def generate_reply_latency_bars(latencies, language='en', n_users=10):
+
+    title_lang_dict = {'en': f'Reply time (top {n_users} by replies)', 'ru': f'Время ответа (топ {n_users} по ответам)'}
+    median_lang_dict = {'en': 'Median', 'ru': 'Медиана'}
+    p90_lang_dict = {'en': '90th percentile', 'ru': '90-й процентиль'}
+    yaxis_lang_dict = {'en': 'Seconds (log scale)', 'ru': 'Секунды (логарифмическая шкала)'}
+
+    stats = user_reply_latencies(latencies, (0.5, 0.9)).head(n_users)
+    fig = go.Figure()
+    for column, name, color in (('q0.5', median_lang_dict[language], "#24d366"),
+                                ('q0.9', p90_lang_dict[language], "#128c7e")):
+        fig.add_trace(go.Bar(x=stats['username'], y=stats[column], name=name, marker_color=color,
+                             customdata=np.stack([stats[column].map(format_duration), stats['n_replies']], axis=-1),
+                             hovertemplate="%{x}: %{customdata[0]}<br>Replies: %{customdata[1]:,}<extra></extra>"))
+    fig.update_layout(title_text=title_lang_dict[language], barmode='group', yaxis_type='log',
+                      yaxis_title=yaxis_lang_dict[language])
+    fig.update_layout(paper_bgcolor="rgba(18,32,43)", plot_bgcolor="rgba(18,32,43)")
+    return fig
+
+
+def reply_latency_heatmap(latencies, language='en', n_users=10):
+
+    title_lang_dict = {'en': f'Median reply time (top {n_users} by replies)',
+                       'ru': f'Медианное время ответа (топ {n_users} по ответам)'}
+    xaxis_lang_dict = {'en': 'Receiver', 'ru': 'Получатель'}
+    yaxis_lang_dict = {'en': 'Sender', 'ru': 'Отправитель'}
+
+    users = sorted(user_reply_latencies(latencies, (0.5,))['username'].head(n_users))
+    medians = pair_reply_latencies(latencies, users, 0.5)
+    # colors on a log scale, from fast (dark) to slow replies
+    fig = go.Figure(go.Heatmap(z=np.log10(np.maximum(medians, 1)), x=users, y=users, colorscale="Greens_r",
+                               customdata=np.vectorize(format_duration)(medians) if len(users) else medians,
+                               hovertemplate="%{y} ---> %{x}: %{customdata}<extra></extra>", showscale=False))
+    fig.update_layout(title_text=title_lang_dict[language])
+    fig.update_layout(paper_bgcolor="rgba(18,32,43)", plot_bgcolor="rgba(18,32,43)")
+    fig.update_layout(xaxis_title=xaxis_lang_dict[language], yaxis_title=yaxis_lang_dict[language])
+    return fig
+
+
 def generate_sentiment_piehart(df,colors_mapping):
 
     agg_df = df["label"].value_counts(normalize=True).reset_index()
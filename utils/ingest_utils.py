@@ -0,0 +1,165 @@
+import contextlib
+import hashlib
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from utils.cache_utils import HASH_CHUNK_SIZE
+from utils.parsers import (
+    HEADER_SAMPLE_WINDOWS,
+    HEADER_SAMPLE_WINDOW_SIZE,
+    HFormatError,
+    _df_from_str,
+    _df_from_stream,
+    extract_header_from_text,
+    parse_telegram_html_stream,
+    parse_telegram_json_stream,
+)
+
+INCREMENTAL_HEAD_SIZE = HEADER_SAMPLE_WINDOWS * HEADER_SAMPLE_WINDOW_SIZE
+
+INGEST_MAX_WORKERS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+
+def clean_filename(filename):
+    '''Cleans up filenames by removing unwanted parts'''
+    return (
+        filename.replace('.txt', '')
+        .replace('WhatsApp Chat with', '')
+        .replace('_', '')
+    )
+
+
+def parse_chat_file(name, stream, use_cache=False):
+    '''Parses an exported chat file based on its extension, returns the chat name and its dataframe.
+
+    With use_cache, WhatsApp header formats are looked up in and added to the persistent formats cache.
+    '''
+    if name.endswith('.txt'):
+        return clean_filename(name), _df_from_stream(stream, use_cache=use_cache)
+
+    elif name.endswith('.html'):
+        return parse_telegram_html_stream(stream)
+
+    elif name.endswith('.json'):
+        return parse_telegram_json_stream(stream)
+
+    elif name.endswith('.zip'):
+        return parse_zip_file(stream, use_cache)
+
+    raise ValueError(f"Unsupported file type: {name}")
+
+
+def parse_zip_file(stream, use_cache=False):
+    '''Parses zipped WhatsApp files, streaming the chat out of the archive'''
+    with zipfile.ZipFile(stream, 'r') as z:
+        txt_file = [f for f in z.namelist() if f.endswith('.txt')][0]
+        with z.open(txt_file) as txt_file:
+            return clean_filename(txt_file.name), _df_from_stream(txt_file, use_cache=use_cache)
+
+
+def _parse_chat_bytes(name, data, use_cache):
+    '''Worker entry point: parses the raw bytes of one file, returning errors instead of raising them'''
+    try:
+        chat_name, df = parse_chat_file(name, io.BytesIO(data), use_cache)
+        return chat_name, df, None
+    except Exception as e:
+        return None, None, e
+
+
+def parse_chat_files(files, max_workers=None, use_cache=False):
+    '''Parses uploaded files, yielding (index, chat_name, df, error) as each file completes.
+
+    Files are sent to a process pool when there is more than one file and more than one core,
+    otherwise they are parsed serially in the current process. use_cache is passed to parse_chat_file.
+    '''
+    max_workers = min(max_workers or INGEST_MAX_WORKERS, len(files))
+
+    if max_workers <= 1:
+        for index, file in enumerate(files):
+            try:
+                chat_name, df = parse_chat_file(file.name, file, use_cache)
+                yield index, chat_name, df, None
+            except Exception as e:
+                yield index, None, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_parse_chat_bytes, file.name, file.getvalue(), use_cache): index
+                   for index, file in enumerate(files)}
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
+
+
+def message_fingerprint(row):
+    '''Fingerprint of a parsed message, used to recognize a chat and its last ingested message'''
+    text = '\x1f'.join([str(row['username']), pd.Timestamp(row['date']).isoformat(), str(row['message'])])
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def is_text_export(name):
+    '''Whether a file is a WhatsApp text export, the format that can be read incrementally'''
+    return name.endswith('.txt') or name.endswith('.zip')
+
+
+@contextlib.contextmanager
+def open_chat_text(file):
+    '''Opens the chat text of a WhatsApp export (.txt or zipped .txt) as a binary stream from its start'''
+    file.seek(0)
+    if file.name.endswith('.zip'):
+        with zipfile.ZipFile(file, 'r') as z:
+            txt_file = [f for f in z.namelist() if f.endswith('.txt')][0]
+            with z.open(txt_file) as stream:
+                yield clean_filename(txt_file), stream
+    else:
+        yield clean_filename(file.name), file
+    file.seek(0)
+
+
+def read_chat_head(file, use_cache=False):
+    '''Parses the head of a WhatsApp export, returns its chat name, first message fingerprint and header format'''
+    with open_chat_text(file) as (chat_name, stream):
+        head = stream.read(INCREMENTAL_HEAD_SIZE).decode(errors='ignore')
+    hformat = extract_header_from_text(head, use_cache=use_cache)
+    if not hformat:
+        return None
+    # the header format is kept in the unescaped form accepted by the parsers
+    hformat = hformat.replace(r'\[', '[').replace(r'\]', ']')
+    first_message = _df_from_str(head, hformat=hformat).iloc[0]
+    return chat_name, message_fingerprint(first_message), hformat
+
+
+def text_source_info(file, hformat):
+    '''Size and hash of the chat text of a WhatsApp export, to recognize later exports that extend it'''
+    digest = hashlib.sha256()
+    size = 0
+    with open_chat_text(file) as (_, stream):
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return {'size': size, 'sha256': digest.hexdigest(), 'hformat': hformat}
+
+
+def read_chat_tail(file, source):
+    '''Parses only the messages a WhatsApp export adds after a previous export described by source.
+
+    Returns None when the export does not start with the exact bytes of the previous one.
+    '''
+    digest = hashlib.sha256()
+    remaining = source['size']
+    with open_chat_text(file) as (_, stream):
+        while remaining:
+            chunk = stream.read(min(HASH_CHUNK_SIZE, remaining))
+            if not chunk:
+                return None
+            digest.update(chunk)
+            remaining -= len(chunk)
+        if digest.hexdigest() != source['sha256']:
+            return None
+        try:
+            return _df_from_stream(stream, auto_header=False, hformat=source['hformat'])
+        except HFormatError:
+            return pd.DataFrame(columns=['date', 'username', 'message'])
@@ -0,0 +1,43 @@
+import numpy as np
+from scipy import sparse
+
+# (sender, receiver) pairs are counted in a dense array up to this many pairs (about 2000 users)
+DENSE_PAIRS_MAX = 1 << 22
+
+
+def reply_matrix(user_codes, n_users):
+    '''Sparse sender x receiver counts of the replies in a sequence of messages, given the code of their senders.
+
+    A message is a reply to the message right before it when their senders differ. Replies are counted by
+    (sender, receiver) pair with a bincount while all the pairs fit in DENSE_PAIRS_MAX counts, else with np.unique.
+    '''
+    senders, receivers = user_codes[1:], user_codes[:-1]
+    replies = senders != receivers
+    pairs = senders[replies] * n_users + receivers[replies]
+    if n_users * n_users <= DENSE_PAIRS_MAX:
+        counts = np.bincount(pairs, minlength=n_users * n_users)
+        pairs = np.flatnonzero(counts)
+        counts = counts[pairs]
+    else:
+        pairs, counts = np.unique(pairs, return_counts=True)
+    return sparse.csr_matrix((counts, (pairs // n_users, pairs % n_users)), shape=(n_users, n_users))
+
+
+def chat_interactions(user_codes, rows, users):
+    '''Messages and replies of every user in the rows of a chat (a slice or positions), users being coded by index.
+
+    Returns {'users': usernames, 'messages': messages of every user, 'replies': sparse reply matrix}.
+    '''
+    codes = np.asarray(user_codes[rows], dtype=np.int64)
+    return {'users': np.asarray(users, dtype=object),
+            'messages': np.bincount(codes, minlength=len(users)),
+            'replies': reply_matrix(codes, len(users))}
+
+
+def top_interactions(interactions, top_n):
+    '''Names and dense reply matrix of the top_n users with the most messages, in alphabetical order'''
+    messages = interactions['messages']
+    top = np.argsort(-messages, kind='stable')[:top_n]
+    top = top[messages[top] > 0]
+    top = top[np.argsort(interactions['users'][top].astype(str), kind='stable')]
+    return interactions['users'][top].tolist(), interactions['replies'][top][:, top].toarray()
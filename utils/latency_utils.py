@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from utils.conversation_utils import to_nanoseconds
+from utils.filter_utils import day_intervals
+
+# Reply delays are counted in log-spaced bins: [0, 1 s), LATENCY_BINS_PER_DECADE bins per decade of seconds from 1 s
+# to 10 ** LATENCY_DECADES s (about 116 days), and a last bin for anything longer
+LATENCY_BINS_PER_DECADE = 10
+LATENCY_DECADES = 7
+LATENCY_EDGES = np.concatenate([[0.0], 10 ** (np.arange(LATENCY_DECADES * LATENCY_BINS_PER_DECADE + 1) /
+                                              LATENCY_BINS_PER_DECADE)])
+N_LATENCY_BINS = len(LATENCY_EDGES)
+
+
+def latency_bins(seconds):
+    '''Latency bin of every delay in seconds'''
+    seconds = np.asarray(seconds, dtype=float)
+    decades = np.log10(np.maximum(seconds, 1.0)) * LATENCY_BINS_PER_DECADE
+    return np.where(seconds < 1, 0, np.minimum(np.floor(decades).astype(np.int64) + 1, N_LATENCY_BINS - 1))
+
+
+def bin_seconds(bins, fraction):
+    '''Delay at a fraction (0 to 1) of latency bins, interpolated geometrically (linearly in the first bin)'''
+    lower = LATENCY_EDGES[bins]
+    upper = np.append(LATENCY_EDGES[1:], LATENCY_EDGES[-1])[bins]
+    geometric = np.maximum(lower, 1.0) * (upper / np.maximum(lower, 1.0)) ** fraction
+    return np.where(bins == 0, upper * fraction, geometric)
+
+
+def build_reply_latencies(df):
+    '''Reply delays of an enriched chat as histograms by (day, sender, receiver), sorted by day.
+
+    A reply is a message right after a message of another user in the same conversation, its delay the time between
+    the two. Returns {'users': usernames, 'cells': epoch_day, sender, receiver, bin and n_replies of every non-empty
+    histogram bin}, users being coded by their index in usernames.
+    '''
+    timestamps = to_nanoseconds(df['timestamp'])
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    user_codes, usernames = pd.factorize(df['username'].astype(str))
+    user_codes = user_codes[order]
+    conversation_id = df['conversation_id'].to_numpy()[order]
+
+    replies = (user_codes[1:] != user_codes[:-1]) & (conversation_id[1:] == conversation_id[:-1])
+    cells = pd.DataFrame({
+        'epoch_day': df['epoch_day'].to_numpy()[order][1:][replies],
+        'sender': user_codes[1:][replies],
+        'receiver': user_codes[:-1][replies],
+        'bin': latency_bins(np.diff(timestamps)[replies] / 1e9),
+    }).groupby(['epoch_day', 'sender', 'receiver', 'bin'], sort=True).size().rename('n_replies').reset_index()
+
+    code_dtype = np.min_scalar_type(max(len(usernames) - 1, 0))
+    return {'users': list(usernames),
+            'cells': cells.astype({'epoch_day': np.int32, 'sender': code_dtype, 'receiver': code_dtype,
+                                   'bin': np.int8, 'n_replies': np.int32})}
+
+
+def select_reply_latencies(latencies, min_date=None, max_date=None, users=None, years=None):
+    '''Histogram cells of the replies in the selected dates and years, between two of the selected users'''
+    cells = latencies['cells']
+    intervals = day_intervals({'epoch_day': cells['epoch_day'].to_numpy()}, min_date, max_date, years)
+    rows = np.concatenate([np.arange(start, end) for start, end in intervals] + [np.empty(0, dtype=np.int64)])
+    if users:
+        selected = np.zeros(len(latencies['users']), dtype=bool)
+        codes = pd.Index(latencies['users']).get_indexer(users)
+        selected[codes[codes >= 0]] = True
+        rows = rows[selected[cells['sender'].to_numpy()[rows]] & selected[cells['receiver'].to_numpy()[rows]]]
+    return {'users': latencies['users'], 'cells': cells.iloc[rows]}
+
+
+def grouped_latency_quantiles(groups, bins, counts, n_groups, quantiles):
+    '''Quantiles (in seconds) of the delays of every group, merged from counts by latency bin.
+
+    Args:
+        groups: group (0 to n_groups - 1) of every count.
+        bins: latency bin of every count.
+        counts: number of replies of every count.
+        quantiles: quantiles to compute, above 0 and up to 1.
+
+    Returns:
+        numpy.ndarray: a row of quantiles for every group, nan for the groups without replies.
+    '''
+    keys, inverse = np.unique(np.asarray(groups, dtype=np.int64) * N_LATENCY_BINS + bins, return_inverse=True)
+    merged = np.bincount(inverse, weights=counts)
+    key_groups, key_bins = keys // N_LATENCY_BINS, keys % N_LATENCY_BINS
+    # groups are contiguous runs of the keys, so the quantiles of all of them are found in one cumulative count
+    cumulative = np.cumsum(merged)
+    totals = np.bincount(key_groups, weights=merged, minlength=n_groups)
+    before = np.cumsum(totals) - totals
+
+    result = np.full((n_groups, len(quantiles)), np.nan)
+    has_replies = totals > 0
+    for column, quantile in enumerate(quantiles):
+        targets = before[has_replies] + quantile * totals[has_replies]
+        positions = np.minimum(np.searchsorted(cumulative, targets, 'left'), len(cumulative) - 1)
+        fraction = (targets - (cumulative[positions] - merged[positions])) / merged[positions]
+        result[has_replies, column] = bin_seconds(key_bins[positions], fraction)
+    return result
+
+
+def user_reply_latencies(latencies, quantiles=(0.5, 0.9)):
+    '''Replies sent and delay quantiles of every user who replied, most replies first'''
+    cells = latencies['cells']
+    senders = cells['sender'].to_numpy()
+    values = grouped_latency_quantiles(senders, cells['bin'].to_numpy(), cells['n_replies'].to_numpy(),
+                                       len(latencies['users']), quantiles)
+    n_replies = np.bincount(senders, weights=cells['n_replies'].to_numpy(), minlength=len(latencies['users']))
+    stats = pd.DataFrame(values, columns=[f'q{quantile:g}' for quantile in quantiles])
+    stats.insert(0, 'n_replies', n_replies.astype(np.int64))
+    stats.insert(0, 'username', latencies['users'])
+    return stats[stats['n_replies'] > 0].sort_values('n_replies', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def pair_reply_latencies(latencies, users, quantile=0.5):
+    '''Delay quantile of the replies of every user of users (rows) to every other one (columns), nan without replies'''
+    cells = latencies['cells']
+    ranks = np.full(len(latencies['users']), -1)
+    codes = pd.Index(latencies['users']).get_indexer(users)
+    ranks[codes[codes >= 0]] = np.arange(len(users))[codes >= 0]
+    senders, receivers = ranks[cells['sender'].to_numpy()], ranks[cells['receiver'].to_numpy()]
+    among = (senders >= 0) & (receivers >= 0)
+    values = grouped_latency_quantiles(senders[among] * len(users) + receivers[among], cells['bin'].to_numpy()[among],
+                                       cells['n_replies'].to_numpy()[among], len(users) ** 2, (quantile,))
+    return values.reshape(len(users), len(users))
+
+
+def format_duration(seconds):
+    '''Short human readable duration, e.g. "45 s", "3.5 min", "2.1 h" or "4.0 d"'''
+    if np.isnan(seconds):
+        return ''
+    for unit, unit_seconds in (('d', 86400), ('h', 3600), ('min', 60)):
+        if seconds >= unit_seconds:
+            return f'{seconds / unit_seconds:.1f} {unit}'
+    return f'{seconds:.0f} s'
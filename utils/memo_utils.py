@@ -0,0 +1,56 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from plotly.basedatatypes import BaseFigure
+from scipy import sparse
+
+# Memory budget of the results memoized per filter state in a session, least recently used ones are evicted first
+FILTER_MEMO_MAX_BYTES = int(os.environ.get('CHAT_ANALYZER_FILTER_MEMO_MAX_BYTES', 256 << 20))
+
+
+def new_memo():
+    '''An empty memo: results in least recently used order, with their sizes'''
+    return {'entries': OrderedDict(), 'nbytes': 0}
+
+
+def memo_nbytes(value):
+    '''Approximate memory used by a memoized value: the nbytes of the arrays it holds, found recursively'''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if sparse.issparse(value):
+        return sum(array.nbytes for array in vars(value).values() if isinstance(array, np.ndarray))
+    if isinstance(value, BaseFigure):
+        # the properties the traces and the layout hold, read in place: to_plotly_json copies and encodes them
+        return sum(memo_nbytes(trace._props) for trace in value.data) + memo_nbytes(value.layout._props)
+    if isinstance(value, dict):
+        return sum(memo_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(memo_nbytes(item) for item in value)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    # any other value (a number, a slice, None...) as an array item
+    return 8
+
+
+def memoized(memo, key, compute, max_bytes=FILTER_MEMO_MAX_BYTES):
+    '''Returns the value memoized under key, computing and storing it first on a miss.
+
+    Least recently used values are evicted while the memo is over max_bytes, the value just stored is always kept.
+    '''
+    entries = memo['entries']
+    if key in entries:
+        entries.move_to_end(key)
+        return entries[key][0]
+
+    value = compute()
+    nbytes = memo_nbytes(value)
+    entries[key] = value, nbytes
+    memo['nbytes'] += nbytes
+    while memo['nbytes'] > max_bytes and len(entries) > 1:
+        _, (_, evicted_nbytes) = entries.popitem(last=False)
+        memo['nbytes'] -= evicted_nbytes
+    return value
@@ -0,0 +1,63 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import gensim
+from nltk import WordNetLemmatizer
+from nltk.stem.porter import PorterStemmer
+
+# Distinct (token, language) pairs kept normalized, chat vocabularies are much smaller than this
+NORMALIZED_TOKENS_CACHE_SIZE = 1 << 18
+
+NORMALIZE_MAX_WORKERS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+# Below this many texts starting the worker processes costs more than it saves
+NORMALIZE_PARALLEL_MIN_TEXTS = 50000
+# Chunks sent to every worker, more than one so that a slow chunk does not leave the other workers idle
+NORMALIZE_CHUNKS_PER_WORKER = 4
+
+_stemmer = PorterStemmer()
+_lemmatizer = WordNetLemmatizer()
+
+
+@functools.lru_cache(maxsize=NORMALIZED_TOKENS_CACHE_SIZE)
+def normalize_token(token, lang='english'):
+    '''Lemmatizes and stems a token (English only), memoized across texts, pages and reruns'''
+    if lang == "english":
+        return _stemmer.stem(_lemmatizer.lemmatize(token, pos='v'))
+    return token
+
+
+def tokenize_texts(texts):
+    '''Tokenizes texts into a vocabulary and, for every text, the ids of its tokens in the vocabulary'''
+    vocabulary = {}
+    token_ids = []
+    for text in texts:
+        token_ids.append([vocabulary.setdefault(token, len(vocabulary))
+                          for token in gensim.utils.simple_preprocess(text)])
+    return list(vocabulary), token_ids
+
+
+def normalize_texts(texts, lang='english'):
+    '''Cleans texts like clean_text, normalizing every distinct token once and rebuilding the texts from token ids'''
+    vocabulary, token_ids = tokenize_texts(texts)
+    normalized = [normalize_token(token, lang) for token in vocabulary]
+    return [' '.join([normalized[token_id] for token_id in ids]) for ids in token_ids]
+
+
+def normalize_texts_parallel(texts, lang='english', max_workers=None):
+    '''Cleans texts like normalize_texts, splitting them into chunks normalized by a process pool.
+
+    Every worker keeps its own stemmer, lemmatizer and token cache. Results are merged back in the order of texts.
+    Small inputs, or a single core, are normalized in the current process.
+    '''
+    texts = list(texts)
+    max_workers = min(max_workers or NORMALIZE_MAX_WORKERS, len(texts) // NORMALIZE_PARALLEL_MIN_TEXTS or 1)
+    if max_workers <= 1:
+        return normalize_texts(texts, lang)
+
+    n_chunks = max_workers * NORMALIZE_CHUNKS_PER_WORKER
+    chunk_size = -(-len(texts) // n_chunks)
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(normalize_texts, chunks, [lang] * len(chunks))
+        return [text for chunk in results for text in chunk]
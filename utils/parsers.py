@@ -1,14 +1,22 @@
 from bs4 import BeautifulSoup
+import codecs
 import dateutil
-from datetime import datetime
+import hashlib
+from html.parser import HTMLParser
+import io
+import json
 import logging
+import mmap
 import re
-from typing import Optional, Tuple, List, Dict
+from typing import Optional, Tuple, List, Dict, Iterator
 
+import numpy as np
 import pandas as pd
 
 from whatstk.utils.exceptions import RegexError
 
+from utils.cache_utils import get_cached_hformat, set_cached_hformat
+
 class HFormatError(Exception):
     """Raised when hformat could not be found."""
 
@@ -60,6 +68,25 @@ regex_simplifier = {
     "%name": rf"(?P<{COLNAMES_DF.USERNAME}>[^:]*)",
 }
 
+HEADER_SAMPLE_WINDOWS = 16
+HEADER_SAMPLE_WINDOW_SIZE = 1 << 14
+HEADER_MIN_SAMPLES = 50
+HEADER_SIGNATURE_LINES = 20
+
+WHATSAPP_CHUNK_SIZE = 1 << 24
+
+TELEGRAM_COLUMNS = ["username", "date", "message", "links"]
+TELEGRAM_BATCH_SIZE = 10000
+TELEGRAM_CHUNK_SIZE = 1 << 20
+
+TELEGRAM_MEDIA_KEYS = ("photo", "file", "media_type", "poll", "location_information", "contact_information")
+TELEGRAM_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_HTML_VOID_TAGS = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+                             "source", "track", "wbr"])
+
 
 def parse_telegram_html(data):
 
@@ -73,7 +100,7 @@ def parse_telegram_html(data):
         if from_name_ is not None and from_name_.find('span') is None:
             username = from_name_.string.strip()
             raw_date = body.find('div', class_='date')['title']
-            timestamp = dateutil.parser.parse(raw_date)
+            timestamp = _telegram_html_date(raw_date)
             links = [l.get('href') for l in body.find_all('a')]
 
         if body.find('div', class_='media_wrap clearfix') is None:
@@ -86,13 +113,544 @@ def parse_telegram_html(data):
     return group_name,pd.DataFrame(data_list)
 
 
+def _telegram_html_date(title: str):
+    """Local date and time of a Telegram HTML message from the title of its date (e.g. "01.02.2023 10:00:00 UTC+03:00").
+
+    The UTC offset is dropped: dates are naive local times in every export format, as the ``date`` field of Telegram
+    JSON exports and the headers of WhatsApp exports, so that chats of different formats can be combined.
+
+    """
+    return dateutil.parser.parse(title).replace(tzinfo=None)
+
+
+class _TelegramHTMLStream(HTMLParser):
+    """Event-driven scanner that reproduces the selectors used by ``parse_telegram_html``.
+
+    Instead of building a DOM, it tracks the open tags of the current ``div.message.default`` and collects the
+    username, date, links and text of each message into columnar batches of ``batch_size`` rows.
+
+    """
+
+    def __init__(self, batch_size: int):
+        super().__init__(convert_charrefs=True)
+        self.batch_size = batch_size
+        self.group_name = None
+        self.batches = []
+        self._batch = _empty_telegram_batch()
+        self._stack = []
+        self._group_parts = None
+        self._message_depth = None
+        # Sender fields are carried over to "joined" messages, exactly as in ``parse_telegram_html``.
+        self._username = None
+        self._timestamp = None
+        self._links = None
+        self._reset_message()
+
+    def _reset_message(self):
+        self._body_depth = None
+        self._body_seen = False
+        self._from_depth = None
+        self._from_parts = None
+        self._from_has_span = False
+        self._date_attrs = None
+        self._message_links = []
+        self._has_media = False
+        self._text_depth = None
+        self._text_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        self._group_parts_done()
+        attrs = dict(attrs)
+        class_attr = attrs.get("class") or ""
+        classes = class_attr.split()
+        depth = len(self._stack)
+        if tag not in _HTML_VOID_TAGS:
+            self._stack.append(tag)
+
+        if tag == "div" and self.group_name is None and self._group_parts is None and class_attr == "text bold":
+            self._group_parts = []
+            return
+
+        if self._message_depth is None:
+            if tag == "div" and "message" in classes and "default" in classes:
+                self._message_depth = depth
+                self._reset_message()
+            return
+
+        if self._body_depth is None:
+            if tag == "div" and not self._body_seen and "body" in classes:
+                self._body_depth = depth
+                self._body_seen = True
+            return
+
+        if tag == "div":
+            if "from_name" in classes and self._from_parts is None:
+                self._from_depth = depth
+                self._from_parts = []
+            if "date" in classes and self._date_attrs is None:
+                self._date_attrs = attrs
+            if class_attr == "media_wrap clearfix":
+                self._has_media = True
+            if "text" in classes and self._text_parts is None:
+                self._text_depth = depth
+                self._text_parts = []
+        elif tag == "span" and self._from_depth is not None:
+            self._from_has_span = True
+        elif tag == "a":
+            self._message_links.append(attrs.get("href"))
+
+    def handle_endtag(self, tag):
+        self._group_parts_done()
+        if tag in _HTML_VOID_TAGS or tag not in self._stack:
+            return
+        del self._stack[len(self._stack) - 1 - self._stack[::-1].index(tag):]
+        depth = len(self._stack)
+
+        if self._message_depth is None:
+            return
+        if self._text_depth is not None and self._text_depth >= depth:
+            self._text_depth = None
+        if self._from_depth is not None and self._from_depth >= depth:
+            self._from_depth = None
+        if self._body_depth is not None and self._body_depth >= depth:
+            self._body_depth = None
+        if self._message_depth >= depth:
+            self._message_depth = None
+            self._add_message()
+
+    def handle_data(self, data):
+        if self._group_parts is not None and self.group_name is None:
+            self._group_parts.append(data)
+        if self._from_depth is not None:
+            self._from_parts.append(data)
+        if self._text_depth is not None:
+            self._text_parts.append(data)
+
+    def _group_parts_done(self):
+        if self._group_parts is not None and self.group_name is None:
+            self.group_name = "".join(self._group_parts).strip()
+
+    def _add_message(self):
+        if not self._body_seen:
+            raise ValueError("Telegram message without a body")
+
+        if self._from_parts is not None and not self._from_has_span:
+            self._username = "".join(self._from_parts).strip()
+            self._timestamp = _telegram_html_date(self._date_attrs["title"])
+            self._links = self._message_links
+        if self._username is None:
+            raise ValueError("Telegram export starts with a message without sender")
+
+        if not self._has_media:
+            if self._text_parts is None:
+                raise ValueError("Telegram message without text")
+            text = "".join(self._text_parts).strip()
+        else:
+            text = "<Media omitted>"
+
+        batch = self._batch
+        batch["username"].append(self._username)
+        batch["date"].append(self._timestamp)
+        batch["message"].append(text)
+        batch["links"].append(self._links)
+        if len(batch["username"]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._batch["username"]:
+            self.batches.append(self._batch)
+            self._batch = _empty_telegram_batch()
+
+
+def _empty_telegram_batch() -> Dict[str, list]:
+    return {col: [] for col in TELEGRAM_COLUMNS}
+
+
+def iter_telegram_html_batches(stream, batch_size: int = TELEGRAM_BATCH_SIZE,
+                               chunk_size: int = TELEGRAM_CHUNK_SIZE) -> Iterator[Tuple[str, Dict[str, list]]]:
+    """Incrementally parse a Telegram HTML export read as a byte stream.
+
+    Args:
+        stream: Binary file-like object with the content of ``messages.html``.
+        batch_size (int): Number of messages per yielded batch.
+        chunk_size (int): Number of bytes read from ``stream`` at a time.
+
+    Yields:
+        tuple: Group name and a batch of messages as columns (dict of lists with keys ``TELEGRAM_COLUMNS``).
+
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = _TelegramHTMLStream(batch_size)
+    while True:
+        chunk = stream.read(chunk_size)
+        parser.feed(decoder.decode(chunk, final=not chunk))
+        if not chunk:
+            parser.close()
+            parser.flush()
+        for batch in parser.batches:
+            yield parser.group_name, batch
+        parser.batches = []
+        if not chunk:
+            break
+
+
+def parse_telegram_html_stream(stream, batch_size: int = TELEGRAM_BATCH_SIZE,
+                               chunk_size: int = TELEGRAM_CHUNK_SIZE) -> Tuple[str, pd.DataFrame]:
+    """Streaming counterpart of ``parse_telegram_html`` with bounded parser memory.
+
+    Args:
+        stream: Binary file-like object with the content of ``messages.html``.
+        batch_size (int): Number of messages per intermediate DataFrame.
+        chunk_size (int): Number of bytes read from ``stream`` at a time.
+
+    Returns:
+        tuple: Group name and DataFrame with columns ``username``, ``date``, ``message`` and ``links``.
+
+    """
+    group_name = None
+    frames = []
+    for group_name, batch in iter_telegram_html_batches(stream, batch_size, chunk_size):
+        frames.append(pd.DataFrame(batch, columns=TELEGRAM_COLUMNS))
+    if not frames:
+        return group_name, pd.DataFrame()
+    return group_name, pd.concat(frames, ignore_index=True)
+
+
+class _JSONStream:
+    """Minimal pull reader that decodes one JSON value at a time from a byte stream."""
+
+    def __init__(self, stream, chunk_size: int):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        chunk = self._stream.read(self._chunk_size)
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(chunk, final=self._eof)
+        self._pos = 0
+
+    def peek(self) -> str:
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or self._eof:
+                return self._buffer[self._pos: self._pos + 1]
+            self._fill()
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed Telegram JSON export: expected '{char}', found '{found}'")
+        self._pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            # A value touching the end of the buffer may be truncated (e.g. a number), read more to be sure
+            if end < len(self._buffer) or self._eof:
+                self._pos = end
+                return value
+            self._fill()
+
+
+def _telegram_json_text(text) -> Tuple[str, List[str]]:
+    """Flatten the ``text`` field of a Telegram JSON message into plain text and links."""
+    if isinstance(text, str):
+        return text, []
+    parts = []
+    links = []
+    for entity in text:
+        if isinstance(entity, str):
+            parts.append(entity)
+            continue
+        parts.append(entity.get("text", ""))
+        if entity.get("type") == "link":
+            links.append(entity.get("text"))
+        elif entity.get("type") == "text_link":
+            links.append(entity.get("href"))
+    return "".join(parts), links
+
+
+def _add_telegram_json_message(batch: Dict[str, list], message: dict):
+    """Append a Telegram JSON message to ``batch``, skipping service messages like the HTML parser does.
+
+    Forwarded messages are attributed to the member who forwarded them, and messages with media are replaced by
+    the ``<Media omitted>`` marker.
+
+    """
+    if message.get("type") != "message":
+        return
+    text, links = _telegram_json_text(message.get("text", ""))
+    links += [message[key] for key in ("photo", "file") if isinstance(message.get(key), str)]
+    if any(key in message for key in TELEGRAM_MEDIA_KEYS):
+        text = "<Media omitted>"
+    batch["username"].append(message.get("from") or "Deleted Account")
+    batch["date"].append(message["date"])
+    batch["message"].append(text.strip())
+    batch["links"].append(links)
+
+
+def iter_telegram_json_batches(stream, batch_size: int = TELEGRAM_BATCH_SIZE,
+                               chunk_size: int = TELEGRAM_CHUNK_SIZE) -> Iterator[Tuple[str, Dict[str, list]]]:
+    """Incrementally parse a Telegram JSON export (``result.json``) read as a byte stream.
+
+    The ``messages`` array is decoded one message at a time, so the whole document is never loaded at once.
+
+    Args:
+        stream: Binary file-like object with the content of ``result.json``.
+        batch_size (int): Number of messages per yielded batch.
+        chunk_size (int): Number of bytes read from ``stream`` at a time.
+
+    Yields:
+        tuple: Group name and a batch of messages as columns (dict with keys ``TELEGRAM_COLUMNS``).
+
+    """
+    reader = _JSONStream(stream, chunk_size)
+    group_name = None
+    batch = _empty_telegram_batch()
+
+    def _complete(batch):
+        batch["date"] = pd.to_datetime(batch["date"], format=TELEGRAM_DATE_FORMAT)
+        return batch
+
+    reader.expect("{")
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+        if key == "messages":
+            reader.expect("[")
+            while reader.peek() != "]":
+                _add_telegram_json_message(batch, reader.value())
+                if len(batch["username"]) >= batch_size:
+                    yield group_name, _complete(batch)
+                    batch = _empty_telegram_batch()
+                if reader.peek() == ",":
+                    reader.expect(",")
+            reader.expect("]")
+        else:
+            value = reader.value()
+            if key == "name":
+                group_name = value
+        if reader.peek() == ",":
+            reader.expect(",")
+    reader.expect("}")
+
+    if batch["username"]:
+        yield group_name, _complete(batch)
+
+
+def parse_telegram_json_stream(stream, batch_size: int = TELEGRAM_BATCH_SIZE,
+                               chunk_size: int = TELEGRAM_CHUNK_SIZE) -> Tuple[str, pd.DataFrame]:
+    """Parse a Telegram JSON export into the same DataFrame schema as ``parse_telegram_html``.
+
+    Args:
+        stream: Binary file-like object with the content of ``result.json``.
+        batch_size (int): Number of messages per intermediate DataFrame.
+        chunk_size (int): Number of bytes read from ``stream`` at a time.
+
+    Returns:
+        tuple: Group name and DataFrame with columns ``username``, ``date``, ``message`` and ``links``.
+
+    """
+    group_name = None
+    frames = []
+    for group_name, batch in iter_telegram_json_batches(stream, batch_size, chunk_size):
+        frames.append(pd.DataFrame(batch, columns=TELEGRAM_COLUMNS))
+    if not frames:
+        return group_name, pd.DataFrame(columns=TELEGRAM_COLUMNS)
+    return group_name, pd.concat(frames, ignore_index=True)
+
+
 def _df_from_str(text: str, auto_header: bool = True, hformat: Optional[str] = None, flip_date: bool = False) -> pd.DataFrame:
+    hformat = _resolve_hformat(text, auto_header, hformat)
+
+    # Generate regex for given hformat
+    r, r_x = generate_regex(hformat=hformat)
+
+    df, _ = _df_from_chunk(text, r, r_x, hformat, flip_date)
+    return df
+
+
+def _df_from_stream(source, chunk_size: int = WHATSAPP_CHUNK_SIZE, auto_header: bool = True,
+                    hformat: Optional[str] = None, flip_date: bool = False, use_cache: bool = False) -> pd.DataFrame:
+    """Chunked counterpart of ``_df_from_str`` reading the chat from a path or a binary stream.
+
+    Args:
+        source (str or file): Path of the chat (memory-mapped) or binary file-like object (e.g. a zip member).
+        chunk_size (int): Number of bytes decoded and parsed at a time.
+        auto_header (bool): Detect the header format from the first chunk.
+        hformat (str): Header format, required if ``auto_header`` is False.
+        flip_date (bool): Swap day and month fields.
+        use_cache (bool): Look up and store the detected header format in the formats cache.
+
+    Returns:
+        pandas.DataFrame: Chat dataframe.
+
+    """
+    chunks = list(_df_chunks_from_stream(source, chunk_size, auto_header, hformat, flip_date, use_cache))
+    if not chunks:
+        raise HFormatError("No chat messages found")
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _df_chunks_from_stream(source, chunk_size: int = WHATSAPP_CHUNK_SIZE, auto_header: bool = True,
+                           hformat: Optional[str] = None, flip_date: bool = False,
+                           use_cache: bool = False) -> Iterator[pd.DataFrame]:
+    """Parse a chat in chunks of about ``chunk_size`` bytes, yielding one DataFrame per chunk.
+
+    Text is decoded incrementally and every chunk is cut at the start of its last header, the rest being carried over
+    to the next chunk, so multi-line messages are never split between chunks.
+
+    Args:
+        source (str or file): Path of the chat (memory-mapped) or binary file-like object (e.g. a zip member).
+        chunk_size (int): Number of bytes decoded and parsed at a time.
+        auto_header (bool): Detect the header format from the first chunk.
+        hformat (str): Header format, required if ``auto_header`` is False.
+        flip_date (bool): Swap day and month fields.
+        use_cache (bool): Look up and store the detected header format in the formats cache.
+
+    Yields:
+        pandas.DataFrame: Chat dataframe of a chunk.
+
+    """
+    buffer = ""
+    pattern = None
+    # Whether day and month are swapped is decided for the whole chat, as by ``_df_from_str``: frames parsed without
+    # the swap are held back until a chunk needs it (their dates are then swapped too) or has a day above 12, which
+    # rules it out. In a chat this happens within its first days, so only their messages are ever held.
+    held = None if flip_date else []
+    for text in _iter_text_chunks(source, chunk_size):
+        buffer += text
+        if pattern is None:
+            # Header detection gets at least as much text as its sample would take from the whole chat
+            detect = auto_header and not hformat
+            if not buffer or (detect and text and len(buffer) < HEADER_SAMPLE_WINDOWS * HEADER_SAMPLE_WINDOW_SIZE):
+                continue
+            hformat = _resolve_hformat(buffer, auto_header, hformat, use_cache)
+            r, r_x = generate_regex(hformat=hformat)
+            pattern = re.compile(r)
+        cut = _last_header_start(pattern, buffer)
+        if cut > 0:
+            ready, flip_date, held = _release_frames(held, flip_date,
+                                                     *_df_from_chunk(buffer[:cut], r, r_x, hformat, flip_date))
+            buffer = buffer[cut:]
+            yield from ready
+    if buffer.strip():
+        ready, flip_date, held = _release_frames(held, flip_date, *_df_from_chunk(buffer, r, r_x, hformat, flip_date))
+        yield from ready
+    yield from held or []
+
+
+def _release_frames(held: Optional[List[pd.DataFrame]], flip_date: bool, df: pd.DataFrame,
+                    chunk_flip_date: bool) -> Tuple[List[pd.DataFrame], bool, Optional[List[pd.DataFrame]]]:
+    """Frames that can be yielded once a chunk is parsed, whether day and month are swapped, and the frames still held.
+
+    Args:
+        held (list): Frames parsed without the swap while it is undecided, None once it is decided.
+        flip_date (bool): Swap the chunk was parsed with.
+        df (pandas.DataFrame): Chat dataframe of the chunk.
+        chunk_flip_date (bool): Whether the chunk needed the swap.
+
+    Returns:
+        tuple: Frames to yield, swap for the next chunks and frames held (None once the swap is decided).
+
+    """
+    if chunk_flip_date != flip_date:
+        if held is None:
+            # A day above 12 ruled the swap out, the whole text can not be parsed either
+            raise ValueError("month must be in 1..12")
+        return [_flip_df_dates(held_df) for held_df in held] + [df], chunk_flip_date, None
+    if held is None:
+        return [df], flip_date, None
+    held.append(df)
+    if (df[COLNAMES_DF.DATE].dt.day > 12).any():
+        return held, flip_date, None
+    return [], flip_date, held
+
+
+def _flip_df_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Swap the day and month of the dates of a chat dataframe parsed without swapping them."""
+    dates = df[COLNAMES_DF.DATE]
+    flipped = pd.to_datetime(pd.DataFrame({"year": dates.dt.year, "month": dates.dt.day, "day": dates.dt.month}))
+    return df.assign(**{COLNAMES_DF.DATE: flipped + (dates - dates.dt.normalize())})
+
+
+def _iter_text_chunks(source, chunk_size: int) -> Iterator[str]:
+    """Decode a path or a binary stream incrementally as UTF-8. Files on disk are memory-mapped.
+
+    Args:
+        source (str or file): Path or binary file-like object.
+        chunk_size (int): Number of bytes decoded at a time.
+
+    Yields:
+        str: Decoded text.
+
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            yield from _iter_text_chunks(f, chunk_size)
+        return
+
+    try:
+        reader = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # In-memory uploads and zip members can not be mapped, they are streamed instead
+        reader = source
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        while True:
+            chunk = reader.read(chunk_size)
+            yield decoder.decode(chunk, final=not chunk)
+            if not chunk:
+                break
+    finally:
+        if reader is not source:
+            reader.close()
+
+
+def _last_header_start(pattern: re.Pattern, text: str) -> int:
+    """Position of the last header starting a line in ``text`` that is followed by more text, 0 if none.
+
+    Args:
+        pattern (re.Pattern): Header regular expression.
+        text (str): Chunk of the chat.
+
+    Returns:
+        int: Start of the header.
+
+    """
+    window = HEADER_SAMPLE_WINDOW_SIZE
+    while True:
+        start = max(0, len(text) - window)
+        cut = 0
+        for match in pattern.finditer(text, start):
+            if match.end() < len(text) and (match.start() == 0 or text[match.start() - 1] == "\n"):
+                cut = match.start()
+        if cut or start == 0:
+            return cut
+        window *= 4
+
+
+def _resolve_hformat(text: str, auto_header: bool, hformat: Optional[str], use_cache: bool = False) -> str:
+    """Escape the given header format or detect it from ``text``."""
     # Get hformat
     if hformat:
         # Bracket is reserved character in RegEx, add backslash before them.
         hformat = hformat.replace("[", r"\[").replace("]", r"\]")
     if not hformat and auto_header:
-        hformat = extract_header_from_text(text)
+        hformat = extract_header_from_text(text, use_cache=use_cache)
         if not hformat:
             raise RuntimeError(
                 "Header automatic extraction failed. Please specify the format manually by setting"
@@ -101,10 +659,11 @@ def _df_from_str(text: str, auto_header: bool = True, hformat: Optional[str] = N
             )
     elif not (hformat or auto_header):
         raise ValueError("If auto_header is False, hformat can't be None.")
+    return hformat
 
-    # Generate regex for given hformat
-    r, r_x = generate_regex(hformat=hformat)
 
+def _df_from_chunk(text: str, r: str, r_x: str, hformat: str, flip_date: bool) -> Tuple[pd.DataFrame, bool]:
+    """Parse a piece of chat starting at a header, returning its DataFrame and whether dates had to be flipped."""
     # Parse chat to DataFrame
     try:
         df = _parse_chat(text, r, flip_date)
@@ -112,12 +671,14 @@ def _df_from_str(text: str, auto_header: bool = True, hformat: Optional[str] = N
         raise HFormatError("hformat '{}' did not match the provided text. No match was found".format(hformat))
 
     except Exception as e:
-        if str(e) == "month must be in 1..12":
-            df = _parse_chat(text, r, flip_date=True)
+        if str(e) != "month must be in 1..12":
+            raise
+        flip_date = True
+        df = _parse_chat(text, r, flip_date=flip_date)
     df = _remove_alerts_from_df(r_x, df)
 
     df = _add_schema(df)
-    return df
+    return df, flip_date
 
 
 def _add_schema(df: pd.DataFrame) -> pd.DataFrame:
@@ -139,14 +700,18 @@ def _add_schema(df: pd.DataFrame) -> pd.DataFrame:
     )
     return df
 
-def extract_header_from_text(text: str, encoding: str = "utf-8") -> Optional[str]:
+def extract_header_from_text(text: str, encoding: str = "utf-8", use_cache: bool = False) -> Optional[str]:
     """Extract header from text.
 
+    The format is inferred from a bounded sample of lines (see ``HEADER_SAMPLE_WINDOWS``). With ``use_cache``, it is
+    also remembered in a persistent cache keyed by the first headers of the chat, which the app ingest enables.
+
     Args:
         text (str): Loaded chat as string (whole text).
         encoding (str): Encoding to use for UTF when reading/writing (ex. ‘utf-8’).
                              `List of Python standard encodings
                              <https://docs.python.org/3/library/codecs.html#standard-encodings>`_.
+        use_cache (bool): Look up and store the detected format in the formats cache.
 
     Returns:
         str: Format extracted. None if no header was extracted.
@@ -166,19 +731,119 @@ def extract_header_from_text(text: str, encoding: str = "utf-8") -> Optional[str
                 >>> extract_header_from_text(text)
                 '%d.%m.%y, %H:%M - %name:
     """
-    # Split lines
-    lines = text.split("\n")
+    # Formats detected before are looked up by the signature of the first headers of the chat
+    signature = _header_signature(text) if use_cache else None
+    if signature:
+        hformat = get_cached_hformat(signature)
+        if hformat:
+            logging.info("Format found in cache was %s", hformat)
+            return hformat
 
     # Get format auto
     try:
-        hformat = _extract_header_format_from_lines(lines)
+        hformat, unambiguous = _extract_header_format_from_sample(text)
         logging.info("Format found was %s", hformat)
+        # Guesses made from ambiguous samples are not remembered, a longer export of the same chat may settle them
+        if signature and unambiguous:
+            set_cached_hformat(signature, hformat)
         return hformat
     except Exception as err:  # noqa
         logging.info("Format not found.")
     return None
 
 
+def _iter_sample_windows(text: str, n_windows: int, window_size: int) -> Iterator[List[str]]:
+    """Yield the complete lines of sample windows of text: the head first, then windows spread evenly over the rest.
+
+    Args:
+        text (str): Loaded chat as string (whole text).
+        n_windows (int): Maximum number of windows.
+        window_size (int): Number of characters per window.
+
+    Yields:
+        list: Lines of a window.
+
+    """
+    if len(text) <= n_windows * window_size:
+        yield text.split("\n")
+        return
+    step = (len(text) - window_size) // (n_windows - 1)
+    for offset in range(0, step * n_windows, step):
+        lines = text[offset: offset + window_size].split("\n")
+        # Drop lines cut by the window boundaries
+        yield lines[1 if offset else 0: -1]
+
+
+def _extract_header_format_from_sample(text: str) -> Tuple[str, bool]:
+    """Extract header format from a bounded sample of lines, stopping as soon as the format is unambiguous.
+
+    Args:
+        text (str): Loaded chat as string (whole text).
+
+    Returns:
+        tuple: Format of the header and whether the sample made it unambiguous.
+
+    """
+    elements_list, template_list = [], []
+    unambiguous = False
+    for lines in _iter_sample_windows(text, HEADER_SAMPLE_WINDOWS, HEADER_SAMPLE_WINDOW_SIZE):
+        elements, templates = _extract_elements_template_from_lines(lines)
+        elements_list += elements
+        template_list += templates
+        unambiguous = _is_header_format_unambiguous(elements_list)
+        if unambiguous:
+            break
+    return _extract_header_format_from_components(elements_list, template_list), unambiguous
+
+
+def _is_header_format_unambiguous(elements_list: List[List[int]]) -> bool:
+    """Check whether the date elements seen so far tell day, month and year positions apart.
+
+    Args:
+        elements_list (list): List with component list.
+
+    Returns:
+        bool: True if enough headers were seen, exactly one position looks like a day and the year is distinguishable
+            from the month.
+
+    """
+    if not elements_list:
+        return False
+    lengths = [len(e) for e in elements_list]
+    len_mode = max(set(lengths), key=lengths.count)
+    elements_list = [e for e in elements_list if len(e) == len_mode]
+    if len(elements_list) < HEADER_MIN_SAMPLES or len_mode < 5:
+        return False
+    maxima = [max(e[pos] for e in elements_list) for pos in range(3)]
+    day_pos = [pos for pos in range(3) if 27 < maxima[pos] < 32]
+    if len(day_pos) != 1:
+        return False
+    others = [maxima[pos] for pos in range(3) if pos != day_pos[0]]
+    return max(others) > 12 >= min(others)
+
+
+def _header_signature(text: str) -> Optional[str]:
+    """Signature of a chat made from its first possible headers, used as key of the detected formats cache.
+
+    Args:
+        text (str): Loaded chat as string (whole text).
+
+    Returns:
+        str: Hex digest, None if no possible header was found in the head of the chat.
+
+    """
+    headers = []
+    for line in text[:HEADER_SAMPLE_WINDOW_SIZE].split("\n")[:-1]:
+        header = _extract_possible_header_from_line(line)
+        if header:
+            headers.append(header)
+            if len(headers) == HEADER_SIGNATURE_LINES:
+                break
+    if not headers:
+        return None
+    return hashlib.sha1("\n".join(headers).encode("utf-8")).hexdigest()
+
+
 def _extract_header_format_from_lines(lines: List[str]) -> str:
     """Extract header from list of lines.
 
@@ -385,9 +1050,14 @@ def generate_regex(hformat: str) -> Tuple[str, str]:
 def _parse_chat(text: str, regex: str, flip_date: bool) -> pd.DataFrame:
     """Parse chat using given regex.
 
+    The text is split on the headers in a single pass, which yields the fields captured by every header and the body
+    of every message as columns. Dates are then built with one vectorized conversion instead of one ``datetime``
+    per message.
+
     Args:
         text (str) Whole log chat text.
         regex (str): Regular expression
+        flip_date (bool): Swap day and month fields (for chats whose day and month order is inverted).
 
     Returns:
         pandas.DataFrame: DataFrame with messages sent by users, index is the date the messages was sent.
@@ -396,94 +1066,65 @@ def _parse_chat(text: str, regex: str, flip_date: bool) -> pd.DataFrame:
         RegexError: When provided regex could not match the text.
 
     """
-    result = []
-    headers = list(re.finditer(regex, text))
-    for i in range(len(headers)):
-        try:
-            line_dict = _parse_line(text, headers, i, flip_date)
-        except KeyError:
-            raise RegexError("Could not match the provided regex with provided text. No match was found.")
-        result.append(line_dict)
-    df_chat = pd.DataFrame.from_records(result)
-    df_chat = df_chat[[COLNAMES_DF.DATE, COLNAMES_DF.USERNAME, COLNAMES_DF.MESSAGE]]
+    pattern = re.compile(regex)
+    # [text before first header, *groups of header 1, message 1, *groups of header 2, message 2, ...]
+    pieces = pattern.split(text)
+    stride = pattern.groups + 1
+    if len(pieces) < stride + 1:
+        raise RegexError("Could not match the provided regex with provided text. No match was found.")
+    columns = {name: pieces[index::stride] for name, index in pattern.groupindex.items()}
+
+    df_chat = pd.DataFrame(
+        {
+            COLNAMES_DF.DATE: _dates_from_header_columns(columns, flip_date),
+            COLNAMES_DF.USERNAME: columns[COLNAMES_DF.USERNAME],
+            COLNAMES_DF.MESSAGE: [msg.strip() for msg in pieces[stride::stride]],
+        }
+    )
     return df_chat
 
 
-def _parse_line(text: str, headers: List[str], i: int, flip_date: bool) -> Dict[str, str]:
-    """Get date, username and message from the i:th intervention.
+def _int_column(values: List[str]) -> np.ndarray:
+    """Convert a column of digit strings to integers, converting each distinct value only once."""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    return np.asarray(uniques, dtype=str).astype(np.int64)[codes]
+
+
+def _dates_from_header_columns(columns: Dict[str, List[str]], flip_date: bool) -> pd.DatetimeIndex:
+    """Build message dates from the date fields captured by the header regex.
 
     Args:
-        text (str): Whole log chat text.
-        headers (list): All headers.
-        i (int): Index denoting the message number.
+        columns (dict): Captured header fields (``year``, ``month``, ``day``, ``hour``, ``minutes`` and optionally
+            ``seconds`` and ``ampm``), one list of strings per field.
+        flip_date (bool): Swap day and month fields.
 
     Returns:
-        dict: i:th date, username and message.
+        pandas.DatetimeIndex: Date of each message.
 
     """
-    result_ = headers[i].groupdict()
-
-    if flip_date:
-        result_['year'],  result_['month'], result_['day'] = result_['month'], result_['day'], result_['month']
-    if "ampm" in result_:
-        hour = int(result_["hour"])
-        mode = result_.get("ampm").lower()
-        if hour == 12 and mode == "am":
-            hour = 0
-        elif hour != 12 and mode == "pm":
-            hour += 12
-    else:
-        hour = int(result_["hour"])
-
+    year = _int_column(columns["year"])
     # Check format of year. If year is 2-digit represented we add 2000
-    if len(result_["year"]) == 2:
-        year = int(result_["year"]) + 2000
-    else:
-        year = int(result_["year"])
-
-    if "seconds" not in result_:
-        date = datetime(
-            year,
-            int(result_["month"]),
-            int(result_["day"]),
-            hour,
-            int(result_["minutes"]),
-        )
-    else:
-        date = datetime(
-            year,
-            int(result_["month"]),
-            int(result_["day"]),
-            hour,
-            int(result_["minutes"]),
-            int(result_["seconds"]),
-        )
-    username = result_[COLNAMES_DF.USERNAME]
-    message = _get_message(text, headers, i)
-    line_dict = {
-        COLNAMES_DF.DATE: date,
-        COLNAMES_DF.USERNAME: username,
-        COLNAMES_DF.MESSAGE: message,
-    }
-    return line_dict
-
+    year = np.where(year < 100, year + 2000, year)
 
-def _get_message(text: str, headers: List[str], i: int) -> str:
-    """Get i:th message from text.
+    month = _int_column(columns["month"])
+    day = _int_column(columns["day"])
+    if flip_date:
+        month, day = day, month
+    if ((month < 1) | (month > 12)).any():
+        raise ValueError("month must be in 1..12")
 
-    Args:
-        text (str): Whole log chat text.
-        headers (list): All headers.
-        i (int): Index denoting the message number.
+    hour = _int_column(columns["hour"])
+    if "ampm" in columns:
+        codes, uniques = pd.factorize(np.asarray(columns["ampm"], dtype=object))
+        is_pm = np.array([ampm[:1].lower() == "p" for ampm in uniques], dtype=bool)[codes]
+        hour = np.where(hour == 12, 0, hour) + np.where(is_pm, 12, 0)
 
-    Returns:
-        str: i:th message.
+    minute = _int_column(columns["minutes"])
+    second = _int_column(columns["seconds"]) if "seconds" in columns else 0
 
-    """
-    msg_start = headers[i].end()
-    msg_end = headers[i + 1].start() if i < len(headers) - 1 else headers[i].endpos
-    msg = text[msg_start:msg_end].strip()
-    return msg
+    return pd.to_datetime(
+        pd.DataFrame({"year": year, "month": month, "day": day, "hour": hour, "minute": minute, "second": second})
+    )
 
 def _remove_alerts_from_df(r_x: str, df: pd.DataFrame) -> pd.DataFrame:
     """Try to get rid of alert/notification messages.
@@ -22,16 +22,15 @@ if not st.session_state.get('wordnet_downloaded'):
     st.session_state['wordnet_downloaded'] = True
 
 
-from nltk.stem.porter import PorterStemmer
-from nltk import WordNetLemmatizer
 import nltk.langnames as lgn
 from nltk.corpus import stopwords
-import gensim
 import re
 import time
 
 from sklearn.preprocessing import normalize
 
+from utils.normalize_utils import normalize_texts, normalize_texts_parallel
+
 def stream_data(text,latncy=0.04):
     for word in text.split():
         yield word + " "
@@ -54,7 +53,7 @@ def get_users_emoji_df(df, method='top_freq'):
     else:
         df['emojis_list'] = df['message'].apply(lambda x: [i for i in emoji.distinct_emoji_list(str(x))])
 
-    emoji_df = df[df['emojis_list'].apply(len) > 0].groupby('username',as_index=False).agg({'emojis_list': 'sum'})
+    emoji_df = df[df['emojis_list'].apply(len) > 0].groupby('username',as_index=False, observed=True).agg({'emojis_list': 'sum'})
     return emoji_df
 
 
@@ -131,13 +130,13 @@ def get_users_top_worlds(df, n_users=10, top_words=5):
         stop_words += [f'{i}מ' for i in stop_words]
         stop_words += [f'{i}ה' for i in stop_words]
 
-    df['clean_text'] = df['message'].apply(lambda x: clean_text(x, lang))
+    df['clean_text'] = get_clean_text(df, lang)
 
     users = df['username'].value_counts()[: min(df['username'].nunique(),n_users)].index
 
     users_text = df[(df['is_media']==False) &
                     (df['username'].isin(users))]\
-        .groupby(['username'], as_index=False).agg({'clean_text': ' '.join})
+        .groupby(['username'], as_index=False, observed=True).agg({'clean_text': ' '.join})
 
     users_top_worlds = run_ctfidf(users_text, stop_words, top_words)
 
@@ -145,17 +144,26 @@ def get_users_top_worlds(df, n_users=10, top_words=5):
 
 
 def clean_text(text, lang='english', ):
-
-    text_list = gensim.utils.simple_preprocess(text)
-
-    if lang == "english":
-        stemmer = PorterStemmer()
-        result = []
-        for token in text_list:
-            result.append(stemmer.stem(WordNetLemmatizer().lemmatize(token, pos='v')))
-        text_list = result
-
-    return ' '.join(text_list)
+    return normalize_texts([text], lang)[0]
+
+
+def get_clean_text(df, lang='english'):
+    '''Returns clean_text of the messages of df (a slice of the session data), computing it on first use.
+
+    Results are memoized in the session per dataset and language, so pages and reruns only clean the messages
+    they have not asked for before, and each distinct message once.
+    '''
+    derived_columns = st.session_state.setdefault('derived_columns', {})
+    key = ('clean_text', st.session_state.get('dataset_id'), lang)
+    if key not in derived_columns:
+        derived_columns[key] = pd.Series(None, index=st.session_state['data'].index, dtype=object)
+    column = derived_columns[key]
+
+    missing = column.index[column.isna()].intersection(df.index)
+    if len(missing):
+        codes, messages = pd.factorize(df.loc[missing, 'message'].astype(str))
+        column.loc[missing] = np.array(normalize_texts_parallel(messages, lang), dtype=object)[codes]
+    return column.loc[df.index]
 
 
 class CTFIDFVectorizer(TfidfTransformer):
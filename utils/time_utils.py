@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+HOUR_LABELS = [f"{hour:02d}:00" for hour in range(24)]
+
+# Integer time dimensions of the enriched chat: hour of day (0-23), weekday (0 is Monday) and ordinals counted from
+# 1970-01-01 of the day, of the week (starting on Monday) and of the month of every message
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+NS_PER_HOUR = 3600 * 10 ** 9
+NS_PER_DAY = 24 * NS_PER_HOUR
+TIME_ORDINALS = {'date': 'epoch_day', 'week': 'epoch_week', 'month': 'epoch_month'}
+WEEK_HOURS = 7 * 24
+
+
+def epoch_days(dates):
+    '''Days since 1970-01-01 of dates (datetime64 or date values, wall clock for timezone aware ones)'''
+    return np.asarray(pd.to_datetime(pd.Series(dates)).dt.tz_localize(None), dtype='datetime64[D]').astype(np.int64)
+
+
+def epoch_weeks(epoch_day):
+    '''Ordinal of the week (Monday to Sunday) of epoch days'''
+    return (epoch_day + EPOCH_WEEKDAY) // 7
+
+
+def epoch_months(epoch_day):
+    '''Ordinal of the month of epoch days'''
+    return np.asarray(epoch_day, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def date_ordinal(granularity, date):
+    '''Ordinal of the day, week or month containing a date'''
+    epoch_day = epoch_days([date])
+    return int({'date': epoch_day, 'week': epoch_weeks(epoch_day), 'month': epoch_months(epoch_day)}[granularity][0])
+
+
+def ordinal_dates(granularity, ordinals):
+    '''First day of the days, weeks or months of ordinals, for labels'''
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    if granularity == 'week':
+        return pd.DatetimeIndex((ordinals * 7 - EPOCH_WEEKDAY).astype('datetime64[D]'))
+    unit = 'datetime64[M]' if granularity == 'month' else 'datetime64[D]'
+    return pd.DatetimeIndex(ordinals.astype(unit).astype('datetime64[D]'))
+
+
+def count_by_ordinal(ordinals, first, last, groups=None, n_groups=1, weights=None):
+    '''Number of rows in every ordinal from first to last (and in every group, if groups are given), with bincount.
+
+    Rows count for their weights when given. Rows outside of first..last are not counted.
+    Returns an integer array of n_groups rows and last - first + 1 columns.
+    '''
+    n_ordinals = max(last - first + 1, 0)
+    positions = np.asarray(ordinals, dtype=np.int64) - first
+    inside = (positions >= 0) & (positions < n_ordinals)
+    bins = positions[inside]
+    if groups is not None:
+        bins = bins + np.asarray(groups, dtype=np.int64)[inside] * n_ordinals
+    weights = None if weights is None else np.asarray(weights)[inside]
+    counts = np.bincount(bins, weights=weights, minlength=n_groups * n_ordinals)
+    return counts.astype(np.int64).reshape(n_groups, n_ordinals)
+
+
+def weekly_activity(weekday, hour, user_codes=None, n_users=1, weights=None):
+    '''Messages by weekday and hour (of every user, if user_codes are given) in a single bincount.
+
+    Rows count for their weights when given. Returns an integer array of n_users x 7 x 24: the matrix of any
+    selection of users is the sum of their slices, and its marginals the sums over its rows or columns.
+    '''
+    bins = np.asarray(weekday, dtype=np.int64) * 24 + np.asarray(hour, dtype=np.int64)
+    if user_codes is not None:
+        bins += np.asarray(user_codes, dtype=np.int64) * WEEK_HOURS
+    counts = np.bincount(bins, weights=weights, minlength=n_users * WEEK_HOURS)
+    return counts.astype(np.int64).reshape(n_users, 7, 24)
+
+
+def roll_up(counts, first_day, granularity):
+    '''Sums the day columns of counts (the first one being epoch day first_day) into weeks or months.
+
+    Returns the ordinal of the first period and an array with a column for every period the days overlap.
+    '''
+    if granularity == 'date':
+        return first_day, counts
+    to_periods = epoch_weeks if granularity == 'week' else epoch_months
+    if counts.shape[1] == 0:
+        return int(to_periods(np.int64(first_day))), counts
+    periods = to_periods(np.arange(first_day, first_day + counts.shape[1]))
+    starts = np.flatnonzero(np.diff(periods, prepend=periods[0] - 1))
+    return int(periods[0]), np.add.reduceat(counts, starts, axis=1)